@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+"""
+Benchmarks of log redaction and formatting
+"""
+
+import argparse
+import itertools
+import json
+import logging
+import platform
+import random
+import subprocess
+import sys
+import time
+import tracemalloc
+from typing import Callable, Dict, List
+
+from bench_filter_datum import legacy_filter_datum
+from filtered_logger import PII_FIELDS, RedactingFormatter, filter_datum
+
+
+FIELD_COUNTS = (4, 8, 16)
+VALUE_LENGTHS = (8, 64)
+SEPARATORS = (";", "|")
+PII_DENSITIES = (0.0, 0.5, 1.0)
+
+
+def make_rows(count: int, field_count: int, value_length: int,
+              pii_density: float, seed: int = 0) -> List[Dict]:
+    """ Builds synthetic rows where about pii_density of the keys are PII.
+    """
+    rnd = random.Random(seed)
+    alphabet = "abcdefghijklmnopqrstuvwxyz0123456789@.-"
+    rows = []
+    for _ in range(count):
+        row = {}
+        for i in range(field_count):
+            if rnd.random() < pii_density:
+                key = PII_FIELDS[i % len(PII_FIELDS)]
+                if key in row:
+                    key = "{}_{}".format(i, key)
+            else:
+                key = "field{}".format(i)
+            row[key] = "".join(rnd.choice(alphabet)
+                               for _ in range(value_length))
+        rows.append(row)
+    return rows
+
+
+def render(row: Dict, separator: str) -> str:
+    """ Renders a row the way main() does. """
+    return (separator + " ").join(f"{k}={v}" for k, v in row.items())
+
+
+def measure(func: Callable, inputs: List) -> Dict:
+    """ Times func over inputs: throughput, latency percentiles and the
+    peak memory allocated while handling one input.
+    """
+    timings = []
+    clock = time.perf_counter_ns
+    for item in inputs:
+        start = clock()
+        func(item)
+        timings.append(clock() - start)
+    timings.sort()
+
+    sample = inputs[:min(len(inputs), 200)]
+    tracemalloc.start()
+    peak = 0
+    for item in sample:
+        tracemalloc.reset_peak()
+        base = tracemalloc.get_traced_memory()[0]
+        func(item)
+        peak += tracemalloc.get_traced_memory()[1] - base
+    tracemalloc.stop()
+
+    total = sum(timings)
+    return {
+        "ops_per_sec": len(timings) / (total / 1e9) if total else 0.0,
+        "p50_us": timings[len(timings) // 2] / 1e3,
+        "p99_us": timings[min(len(timings) - 1,
+                              int(len(timings) * 0.99))] / 1e3,
+        "alloc_bytes_per_op": peak / len(sample) if sample else 0.0,
+    }
+
+
+def run_case(count: int, field_count: int, value_length: int,
+             separator: str, pii_density: float) -> List[Dict]:
+    """ Runs every benchmark for one combination of parameters. """
+    rows = make_rows(count, field_count, value_length, pii_density)
+    messages = [render(row, separator) for row in rows]
+    formatter = RedactingFormatter(PII_FIELDS)
+    formatter.SEPARATOR = separator
+    logger = logging.getLogger("benchmarks")
+
+    def text_record(message):
+        return logger.makeRecord(logger.name, logging.INFO, __file__, 0,
+                                 message, None, None)
+
+    def row_record(row):
+        return logger.makeRecord(logger.name, logging.INFO, __file__, 0,
+                                 "", None, None, extra={"row": row})
+
+    benches = {
+        "legacy_filter_datum": (lambda m: legacy_filter_datum(
+            PII_FIELDS, "***", m, separator), messages),
+        "filter_datum": (lambda m: filter_datum(
+            PII_FIELDS, "***", m, separator), messages),
+        "formatter_text": (formatter.format,
+                           [text_record(m) for m in messages]),
+        "formatter_row": (formatter.format,
+                          [row_record(row) for row in rows]),
+        "main_loop_text": (lambda row: formatter.format(
+            text_record(render(row, separator))), rows),
+        "main_loop_row": (lambda row: formatter.format(
+            row_record(dict(row))), rows),
+    }
+    results = []
+    for name, (func, inputs) in benches.items():
+        result = {
+            "name": name,
+            "fields": field_count,
+            "value_length": value_length,
+            "separator": separator,
+            "pii_density": pii_density,
+        }
+        result.update(measure(func, inputs))
+        results.append(result)
+    return results
+
+
+def case_key(result: Dict) -> tuple:
+    """ Identifies a result independently of its measurements. """
+    return (result["name"], result["fields"], result["value_length"],
+            result["separator"], result["pii_density"])
+
+
+def git_revision() -> str:
+    """ Commit the benchmarks ran against, if known. """
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"],
+                              capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main() -> None:
+    """ Command line entry point.
+    """
+    parser = argparse.ArgumentParser(description=__doc__.strip())
+    parser.add_argument('-n', '--count', type=int, default=2000,
+                        help="records per case")
+    parser.add_argument('-o', '--output', help="write results as JSON")
+    parser.add_argument('-c', '--compare',
+                        help="earlier JSON results to compare against")
+    args = parser.parse_args()
+
+    results = []
+    for case in itertools.product(FIELD_COUNTS, VALUE_LENGTHS, SEPARATORS,
+                                  PII_DENSITIES):
+        results.extend(run_case(args.count, *case))
+
+    baseline = {}
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = {case_key(r): r for r in json.load(f)["results"]}
+
+    line = "{:<20} f={:<3} len={:<3} sep={} pii={:<4} {:>12,.0f} ops/s " \
+           "p50={:>8.2f}us p99={:>8.2f}us {:>8.0f}B"
+    for r in results:
+        text = line.format(r["name"], r["fields"], r["value_length"],
+                           r["separator"], r["pii_density"], r["ops_per_sec"],
+                           r["p50_us"], r["p99_us"], r["alloc_bytes_per_op"])
+        old = baseline.get(case_key(r))
+        if old and old["ops_per_sec"]:
+            text += " {:+.1%}".format(r["ops_per_sec"] / old["ops_per_sec"]
+                                      - 1)
+        print(text)
+
+    if args.output:
+        report = {
+            "revision": git_revision(),
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "count": args.count,
+            "results": results,
+        }
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
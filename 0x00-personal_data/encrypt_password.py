@@ -3,12 +3,31 @@
 Password encryption and validation
 """
 
+import os
+import time
+import warnings
+from concurrent.futures import Future, ProcessPoolExecutor
+from itertools import repeat
+from typing import Iterable, List, Optional, Tuple
+
 import bcrypt
 
 
-def hash_password(password: str) -> bytes:
-    """ Hash the password with bcrypt and return the salted hash """
-    salt = bcrypt.gensalt()
+DEFAULT_COST = 12
+MIN_COST = 4
+MAX_COST = 31
+LATENCY_BUDGET_MS = 100
+# calibration never picks a cost below this one
+COST_FLOOR = int(os.environ.get('BCRYPT_COST_FLOOR', DEFAULT_COST))
+
+_executor = None
+_cost = DEFAULT_COST
+
+
+def hash_password(password: str, rounds: Optional[int] = None) -> bytes:
+    """ Hash the password with bcrypt and return the salted hash
+    rounds defaults to the cost picked by calibrate_cost """
+    salt = bcrypt.gensalt(rounds=_cost if rounds is None else rounds)
     hashed_password = bcrypt.hashpw(password.encode('utf-8'), salt)
     return hashed_password
 
@@ -16,3 +35,96 @@ def hash_password(password: str) -> bytes:
 def is_valid(hashed_password: bytes, password: str) -> bool:
     """ Check if the provided password matches the hashed password """
     return bcrypt.checkpw(password.encode('utf-8'), hashed_password)
+
+
+def calibrate_cost(budget_ms: float = LATENCY_BUDGET_MS,
+                   floor: int = COST_FLOOR) -> int:
+    """ Pick the highest bcrypt cost hashing within budget_ms on this
+    machine, but not below floor, and use it for hash_password from now
+    on """
+    global _cost
+    cost = MIN_COST
+    while cost < MAX_COST:
+        start = time.perf_counter()
+        bcrypt.hashpw(b"calibration", bcrypt.gensalt(rounds=cost + 1))
+        if (time.perf_counter() - start) * 1000 > budget_ms:
+            break
+        cost += 1
+    if cost < floor:
+        warnings.warn("bcrypt cost {} fits the {} ms budget, using the "
+                      "floor {} instead".format(cost, budget_ms, floor))
+        cost = floor
+    _cost = cost
+    return cost
+
+
+def hash_cost(hashed_password: bytes) -> int:
+    """ Read the cost factor out of a bcrypt hash """
+    return int(hashed_password.split(b'$')[2])
+
+
+def needs_rehash(hashed_password: bytes) -> bool:
+    """ Check if a stored hash uses a lower cost than hash_password """
+    return hash_cost(hashed_password) < _cost
+
+
+def verify_and_rehash(hashed_password: bytes,
+                      password: str) -> Tuple[bool, Optional[bytes]]:
+    """ Check the password and, when it matches a hash with an outdated
+    cost, also return a new hash for the caller to store """
+    if not is_valid(hashed_password, password):
+        return False, None
+    if needs_rehash(hashed_password):
+        return True, hash_password(password)
+    return True, None
+
+
+def _available_cores() -> int:
+    """ Number of cores this process may run on """
+    if hasattr(os, 'sched_getaffinity'):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+def _get_executor() -> ProcessPoolExecutor:
+    """ Process pool shared by the batch and async helpers """
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(max_workers=_available_cores())
+    return _executor
+
+
+def _is_valid_pair(pair: Tuple[bytes, str]) -> bool:
+    """ is_valid taking (hashed_password, password) as one argument """
+    return is_valid(*pair)
+
+
+def _chunksize(count: int) -> int:
+    """ Spreads count items over a few chunks per worker """
+    return max(1, count // (_available_cores() * 4))
+
+
+def hash_passwords(passwords: Iterable[str]) -> List[bytes]:
+    """ Hash many passwords in parallel, keeping their order """
+    passwords = list(passwords)
+    # workers get the cost explicitly: spawned ones do not inherit _cost
+    return list(_get_executor().map(hash_password, passwords,
+                                    repeat(_cost, len(passwords)),
+                                    chunksize=_chunksize(len(passwords))))
+
+
+def verify_many(pairs: Iterable[Tuple[bytes, str]]) -> List[bool]:
+    """ Check many (hashed_password, password) pairs in parallel """
+    pairs = list(pairs)
+    return list(_get_executor().map(_is_valid_pair, pairs,
+                                    chunksize=_chunksize(len(pairs))))
+
+
+def hash_password_async(password: str) -> Future:
+    """ Hash the password in the process pool, returning a Future """
+    return _get_executor().submit(hash_password, password, _cost)
+
+
+def is_valid_async(hashed_password: bytes, password: str) -> Future:
+    """ Check the password in the process pool, returning a Future """
+    return _get_executor().submit(is_valid, hashed_password, password)
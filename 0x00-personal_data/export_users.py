@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+"""
+Parallel redacted export of the users table
+"""
+
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+from multiprocessing import Pool
+from typing import Any, Dict, List, Tuple
+
+import filtered_logger
+from filtered_logger import (PII_FIELDS, RedactingFormatter, USER_COLUMNS,
+                             fetch_batches, get_db, users_query)
+
+
+FORMATS = ('jsonl', 'csv')
+# not a PII column: its values may leave the database as range bounds
+DEFAULT_KEY = 'last_login'
+
+
+def shard_ranges(boundaries: List[Any]) -> List[Tuple[Any, Any]]:
+    """ Turns increasing key values into [lo, hi) ranges covering every
+    key, None standing for an open end.
+    """
+    bounds = [None] + list(boundaries) + [None]
+    return list(zip(bounds, bounds[1:]))
+
+
+def key_boundaries(datab, key: str, shards: int,
+                   batch_size: int) -> List[Any]:
+    """ Key values splitting the users table into shards ranges of
+    similar row counts, read in a single ordered scan of the key.
+    Rows sharing a key value always fall in the same range, so there can
+    be fewer ranges than asked for.
+    """
+    db_cursor = datab.cursor()
+    try:
+        db_cursor.execute(
+            "SELECT COUNT(users.`{0}`) FROM users;".format(key))
+        total = db_cursor.fetchone()[0]
+    finally:
+        db_cursor.close()
+    shards = max(1, min(shards, total))
+    cuts = [total * i // shards for i in range(1, shards)]
+    boundaries = []
+    db_cursor = datab.cursor(buffered=False)
+    try:
+        db_cursor.execute(
+            "SELECT users.`{0}` FROM users WHERE users.`{0}` IS NOT NULL"
+            " ORDER BY users.`{0}`;".format(key))
+        position = 0
+        for batch in fetch_batches(db_cursor, batch_size):
+            for row in batch:
+                while cuts and cuts[0] == position:
+                    cuts.pop(0)
+                    if not boundaries or row[0] > boundaries[-1]:
+                        boundaries.append(row[0])
+                position += 1
+    finally:
+        db_cursor.close()
+    return boundaries
+
+
+def range_condition(key: str, lo: Any,
+                    hi: Any) -> Tuple[str, Tuple[Any, ...]]:
+    """ WHERE clause and parameters selecting the keys in [lo, hi).
+    NULL keys belong to the first range.
+    """
+    column = "users.`{}`".format(key)
+    if lo is None and hi is None:
+        return "", ()
+    if lo is None:
+        return " WHERE ({0} IS NULL OR {0} < %s)".format(column), (hi,)
+    if hi is None:
+        return " WHERE {} >= %s".format(column), (lo,)
+    return " WHERE {0} >= %s AND {0} < %s".format(column), (lo, hi)
+
+
+def redact_row(row: tuple, columns: tuple, fields: tuple) -> Dict:
+    """ Maps a users row to its columns with the PII values redacted.
+    """
+    record = dict(zip(columns, row))
+    for fld in fields:
+        if fld in record:
+            record[fld] = RedactingFormatter.REDACTION
+    return record
+
+
+def _reset_pool() -> None:
+    """ Drops a pool inherited from the parent so each worker connects. """
+    filtered_logger._db_pool = None
+
+
+def export_shard(job: Tuple[int, Any, Any, str, str, str, int]) -> Dict:
+    """ Streams one key range of the users table into its own part file.
+    """
+    index, lo, hi, key, out_dir, fmt, batch_size = job
+    part = "users-{:05d}.{}".format(index, fmt)
+    columns, query = users_query()
+    condition, params = range_condition(key, lo, hi)
+    rows = 0
+    with get_db() as datab, \
+            open(os.path.join(out_dir, part), 'w', newline='') as f:
+        db_cursor = datab.cursor(buffered=False)
+        try:
+            db_cursor.execute(query + condition + ";", params)
+            writer = None
+            if fmt == 'csv':
+                writer = csv.DictWriter(f, USER_COLUMNS)
+                writer.writeheader()
+            for batch in fetch_batches(db_cursor, batch_size):
+                records = [redact_row(row, columns, PII_FIELDS)
+                           for row in batch]
+                if writer:
+                    writer.writerows(records)
+                else:
+                    f.writelines(json.dumps(record, default=str) + "\n"
+                                 for record in records)
+                rows += len(records)
+        finally:
+            db_cursor.close()
+    if key in PII_FIELDS:
+        # bounds are values of the key: keep them out of the manifest
+        lo, hi = (None if bound is None else RedactingFormatter.REDACTION
+                  for bound in (lo, hi))
+    return {"part": part, "lo": lo, "hi": hi, "rows": rows}
+
+
+def export_users(out_dir: str, workers: int, fmt: str = 'jsonl',
+                 key: str = DEFAULT_KEY, batch_size: int = None,
+                 allow_pii_key: bool = False) -> Dict:
+    """ Exports the users table as redacted part files plus a manifest.
+    Range bounds are read out of the database, so a PII key is refused
+    unless allow_pii_key is set.
+    """
+    if fmt not in FORMATS:
+        raise ValueError("format must be one of {}".format(FORMATS))
+    if key not in USER_COLUMNS:
+        raise ValueError("key must be one of {}".format(USER_COLUMNS))
+    if key in PII_FIELDS and not allow_pii_key:
+        raise ValueError("key {} is a PII field: its values would leave "
+                         "the database as shard bounds".format(key))
+    if batch_size is None:
+        batch_size = filtered_logger.DB_BATCH_SIZE
+    os.makedirs(out_dir, exist_ok=True)
+
+    with get_db() as datab:
+        boundaries = key_boundaries(datab, key, workers, batch_size)
+
+    jobs = [(i, lo, hi, key, out_dir, fmt, batch_size)
+            for i, (lo, hi) in enumerate(shard_ranges(boundaries))]
+    with Pool(workers, initializer=_reset_pool) as pool:
+        shards = pool.map(export_shard, jobs)
+
+    manifest = {
+        "format": fmt,
+        "key": key,
+        "redacted": list(PII_FIELDS),
+        "rows": sum(shard["rows"] for shard in shards),
+        "shards": shards,
+    }
+    with open(os.path.join(out_dir, "manifest.json"), 'w') as f:
+        json.dump(manifest, f, indent=2, default=str)
+    return manifest
+
+
+def main() -> None:
+    """ Command line entry point.
+    """
+    parser = argparse.ArgumentParser(description=__doc__.strip())
+    parser.add_argument('out_dir', help="directory for part files")
+    parser.add_argument('-w', '--workers', type=int, default=os.cpu_count(),
+                        help="number of shards and worker processes")
+    parser.add_argument('-f', '--format', choices=FORMATS, default='jsonl')
+    parser.add_argument('-k', '--key', default=DEFAULT_KEY,
+                        help="column whose value ranges make the shards")
+    parser.add_argument('--allow-pii-key', action='store_true',
+                        help="accept a PII column as key")
+    parser.add_argument('-b', '--batch-size', type=int, default=None)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    manifest = export_users(args.out_dir, args.workers, args.format,
+                            args.key, args.batch_size, args.allow_pii_key)
+    elapsed = time.perf_counter() - start
+    print("{} rows in {} shards in {:.2f}s".format(
+        manifest["rows"], len(manifest["shards"]), elapsed), file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -3,27 +3,79 @@
 Data Processing Script
 """
 
+import copy
+import functools
 import logging
 import os
+import queue
 import re
-from typing import List
+import sys
+import threading
+from typing import Iterator, List, Mapping, Optional, Pattern, TextIO, Tuple
 import mysql.connector
 
 
 PII_FIELDS = ('name', 'email', 'phone', 'ssn', 'password')
+REDACTION_CACHE_SIZE = 128
+LOG_QUEUE_SIZE = 10000
+LOG_BATCH_SIZE = 512
+USER_COLUMNS = ('name', 'email', 'phone', 'ssn', 'password', 'ip',
+                'last_login', 'user_agent')
+DB_POOL_SIZE = 5
+DB_BATCH_SIZE = 1000
+
+_db_pool = None
+
+
+@functools.lru_cache(maxsize=REDACTION_CACHE_SIZE)
+def redaction_pattern(fields: Tuple[str, ...],
+                      separator: str) -> Optional[Pattern]:
+    """ Compiles one alternation pattern matching any of the fields.
+    """
+    if not fields:
+        return None
+    alternation = "|".join(re.escape(fld) for fld in fields)
+    if len(separator) == 1:
+        value = rf"[^{re.escape(separator)}\n]*"
+    else:
+        value = ".*?"
+    return re.compile(rf"({alternation})={value}{re.escape(separator)}")
 
 
 def filter_datum(fields: List[str], redaction: str, message: str,
                  separator: str) -> str:
     """ Redacts sensitive information in the log message. """
-    for fld in fields:
-        message = re.sub(rf"{fld}=(.*?)\{separator}",
-                         f'{fld}={redaction}{separator}', message)
-    return message
+    pattern = redaction_pattern(tuple(fields), separator)
+    if pattern is None:
+        return message
+    tail = "=" + redaction + separator
+    return pattern.sub(lambda match: match.group(1) + tail, message)
+
+
+@functools.lru_cache(maxsize=REDACTION_CACHE_SIZE)
+def row_redaction_plan(fields: Tuple[str, ...], keys: Tuple[str, ...],
+                       separator: str) -> Optional[Tuple[bool, ...]]:
+    """ Tells, for each key of a row, whether filter_datum would redact its
+    value once the row is rendered as "key=value<separator> ...".
+    Returns None when the keys themselves could confuse the regex.
+    """
+    plan = []
+    for key in keys:
+        if type(key) is not str or "=" in key or separator in key \
+                or "\n" in key:
+            return None
+        plan.append(any(key.endswith(fld) for fld in fields))
+    if plan:
+        # the last value has no trailing separator, so the regex skips it
+        plan[-1] = False
+    return tuple(plan)
 
 
 class RedactingFormatter(logging.Formatter):
-    """ Formatter class that redacts PII from log messages."""
+    """ Formatter class that redacts PII from log messages.
+    A mapping passed as extra={"row": ...} is rendered as the message with
+    its PII values replaced by key, without scanning the text.
+    """
 
     REDACTION = "***"
     FORMAT = "[HOLBERTON] %(name)s %(levelname)s %(asctime)-15s: %(message)s"
@@ -36,62 +88,366 @@ class RedactingFormatter(logging.Formatter):
 
     def format(self, record: logging.LogRecord) -> str:
         """ Initializes RedactingFormatter with specif FIELDS. """
-        return filter_datum(self.fields, self.REDACTION,
-                            super().format(record), self.SEPARATOR)
+        row = getattr(record, 'row', None)
+        if not isinstance(row, Mapping):
+            return filter_datum(self.fields, self.REDACTION,
+                                super().format(record), self.SEPARATOR)
+        message = None
+        if "=" not in record.name and not record.exc_info \
+                and not record.stack_info:
+            message = self.format_row(row)
+        if message is None:
+            record = copy.copy(record)
+            record.msg = self.render_row(row)
+            record.args = None
+            return filter_datum(self.fields, self.REDACTION,
+                                super().format(record), self.SEPARATOR)
+        record.message = message
+        if self.usesTime():
+            record.asctime = self.formatTime(record, self.datefmt)
+        return self.formatMessage(record)
+
+    def render_row(self, row: Mapping) -> str:
+        """ Renders a row the way main() logs it, without redaction. """
+        return (self.SEPARATOR + " ").join(
+            f"{key}={value}" for key, value in row.items())
+
+    def format_row(self, row: Mapping) -> Optional[str]:
+        """ Renders a row with its PII values redacted by key lookup.
+        Returns None when only filter_datum can reproduce the text output.
+        """
+        plan = row_redaction_plan(tuple(self.fields), tuple(row),
+                                  self.SEPARATOR)
+        if plan is None:
+            return None
+        parts = []
+        for (key, value), redact in zip(row.items(), plan):
+            value = f"{value}"
+            if self.SEPARATOR in value or "\n" in value:
+                return None
+            if redact:
+                value = self.REDACTION
+            elif "=" in value:
+                return None
+            parts.append(f"{key}={value}")
+        return (self.SEPARATOR + " ").join(parts)
+
+
+class AsyncStreamHandler(logging.Handler):
+    """ Handler that queues records for a background thread, which formats
+    and writes them to the stream in batches.
+
+    overflow decides what happens when the queue is full: "block" waits
+    for room, "drop" discards the record and "sample" waits only for one
+    record out of every sample_rate, discarding the others.
+    """
+
+    OVERFLOW_POLICIES = ('block', 'drop', 'sample')
+    terminator = "\n"
+
+    def __init__(self, stream: TextIO = None, maxsize: int = LOG_QUEUE_SIZE,
+                 overflow: str = 'block', batch_size: int = LOG_BATCH_SIZE,
+                 sample_rate: int = 10):
+        """ Starts the listener thread """
+        if overflow not in self.OVERFLOW_POLICIES:
+            raise ValueError("overflow must be one of {}"
+                             .format(self.OVERFLOW_POLICIES))
+        super().__init__()
+        self.stream = stream if stream is not None else sys.stderr
+        self.overflow = overflow
+        self.batch_size = batch_size
+        self.sample_rate = sample_rate
+        self.dropped = 0
+        self._overflowed = 0
+        self._queue = queue.Queue(maxsize)
+        self._closed = False
+        self._listening = True
+        self._unwritten = 0
+        self._written = threading.Condition()
+        self._listener = threading.Thread(target=self._listen, daemon=True,
+                                          name="AsyncStreamHandler")
+        self._listener.start()
+
+    def emit(self, record: logging.LogRecord) -> None:
+        """ Queues the record according to the overflow policy.
+        Once the handler is closed, records are dropped and reported
+        through handleError.
+        """
+        try:
+            if self._closed or not self._listening:
+                self.dropped += 1
+                raise RuntimeError("AsyncStreamHandler is closed")
+            queued = copy.copy(record)
+            queued.msg = record.getMessage()
+            queued.args = None
+            try:
+                self._queue.put_nowait(queued)
+            except queue.Full:
+                if self.overflow == 'sample':
+                    self._overflowed += 1
+                    keep = self._overflowed % self.sample_rate == 0
+                else:
+                    keep = self.overflow == 'block'
+                if not keep:
+                    self.dropped += 1
+                    return
+                self._put(queued)
+            with self._written:
+                self._unwritten += 1
+        except Exception:
+            self.handleError(record)
+
+    def _put(self, item: Optional[logging.LogRecord]) -> None:
+        """ Waits for room in the queue, as long as the listener runs. """
+        while True:
+            try:
+                self._queue.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                if not self._listening:
+                    if item is not None:
+                        self.dropped += 1
+                    raise RuntimeError("AsyncStreamHandler stopped")
+
+    def _listen(self) -> None:
+        """ Formats and writes queued records until the handler closes. """
+        try:
+            while True:
+                batch = [self._queue.get()]
+                while len(batch) < self.batch_size:
+                    try:
+                        batch.append(self._queue.get_nowait())
+                    except queue.Empty:
+                        break
+                self._write(batch)
+                with self._written:
+                    self._unwritten -= len(batch) - batch.count(None)
+                    self._written.notify_all()
+                # records logged while close() runs may follow the sentinel
+                if None in batch:
+                    return
+        finally:
+            with self._written:
+                self._listening = False
+                self._written.notify_all()
+
+    def _write(self, batch: List[Optional[logging.LogRecord]]) -> None:
+        """ Writes a batch of records with a single stream write. """
+        lines = []
+        for record in batch:
+            if record is None:
+                continue
+            try:
+                lines.append(self.format(record) + self.terminator)
+            except Exception:
+                self.handleError(record)
+        if not lines:
+            return
+        try:
+            self.stream.write("".join(lines))
+            self.stream.flush()
+        except Exception:
+            self.handleError(batch[0])
+
+    def flush(self) -> None:
+        """ Waits until every queued record has been written, or the
+        listener has stopped. """
+        with self._written:
+            while self._unwritten > 0 and self._listening:
+                self._written.wait()
+
+    def close(self) -> None:
+        """ Flushes pending records and stops the listener thread.
+        Records still queued behind the listener count as dropped.
+        """
+        self._closed = True
+        if self._listening:
+            try:
+                self._put(None)
+            except RuntimeError:
+                pass
+            self._listener.join()
+        while True:
+            try:
+                if self._queue.get_nowait() is not None:
+                    self.dropped += 1
+            except queue.Empty:
+                break
+        super().close()
 
 
-def get_logger() -> logging.Logger:
+def get_logger(asynchronous: bool = False,
+               overflow: str = 'block') -> logging.Logger:
     """ Initializes and returns a logger instance.
+    With asynchronous, redaction and writes run on a background thread.
     """
 
     user_logger = logging.getLogger("user_data")
     user_logger.setLevel(logging.INFO)
     user_logger.propagate = False
-    user_handler = logging.StreamHandler()
+    for handler in list(user_logger.handlers):
+        user_logger.removeHandler(handler)
+        handler.close()
+    if asynchronous:
+        user_handler = AsyncStreamHandler(overflow=overflow)
+    else:
+        user_handler = logging.StreamHandler()
     user_handler.setFormatter(RedactingFormatter(PII_FIELDS))
     user_logger.addHandler(user_handler)
     return user_logger
 
 
-def get_db() -> mysql.connector.connection.MySQLConnection:
+class PooledConnection():
+    """ Connection checked out of a ConnectionPool.
+    Behaves like the wrapped connection; close() hands it back.
+    """
+
+    def __init__(self, pool: 'ConnectionPool', cnx):
+        """ Wraps cnx, checked out of pool """
+        self._pool = pool
+        self._cnx = cnx
+
+    def __getattr__(self, name: str):
+        """ Delegates to the wrapped connection """
+        if self._cnx is None:
+            raise mysql.connector.errors.InterfaceError(
+                "Connection was handed back to its pool")
+        return getattr(self._cnx, name)
+
+    def close(self) -> None:
+        """ Hands the connection back to its pool """
+        cnx, self._cnx = self._cnx, None
+        if cnx is not None:
+            self._pool.release(cnx)
+
+    def __enter__(self) -> 'PooledConnection':
+        """ Usable in a with statement, like a MySQLConnection """
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        """ Hands the connection back to its pool """
+        self.close()
+
+
+class ConnectionPool():
+    """ Pool of database connections opened on demand.
+
+    At most size connections are open at once: get_connection opens a
+    new one only when none is idle, and waits for one to be handed back
+    when size are in use.
+    """
+
+    def __init__(self, size: int, **config):
+        """ Creates an empty pool connecting with config """
+        self.config = config
+        self._slots = threading.BoundedSemaphore(max(1, size))
+        self._idle = queue.LifoQueue()
+
+    def get_connection(self, timeout: float = None) -> PooledConnection:
+        """ Checks out a connection, waiting at most timeout seconds for
+        one to be free
+        """
+        if not self._slots.acquire(timeout=timeout):
+            raise mysql.connector.errors.PoolError(
+                "No connection available after {}s".format(timeout))
+        try:
+            try:
+                cnx = self._idle.get_nowait()
+            except queue.Empty:
+                cnx = mysql.connector.connect(**self.config)
+            else:
+                if not cnx.is_connected():
+                    cnx.reconnect()
+        except BaseException:
+            self._slots.release()
+            raise
+        return PooledConnection(self, cnx)
+
+    def release(self, cnx) -> None:
+        """ Takes back a checked out connection, dropping it when its
+        session cannot be reset
+        """
+        try:
+            cnx.reset_session()
+        except mysql.connector.Error:
+            try:
+                cnx.close()
+            except mysql.connector.Error:
+                pass
+        else:
+            self._idle.put(cnx)
+        finally:
+            self._slots.release()
+
+
+def get_db() -> PooledConnection:
     """ Establishes a connection to the database.
+    Connections come from a pool shared by the process, opened only when
+    needed; closing one hands it back to the pool.
+    """
+    global _db_pool
+    if _db_pool is None:
+        db_paswd = os.environ.get("PERSONAL_DATA_DB_PASSWORD", "")
+        db_username = os.environ.get('PERSONAL_DATA_DB_USERNAME', "root")
+        db_host = os.environ.get('PERSONAL_DATA_DB_HOST', 'localhost')
+        db_nm = os.environ.get('PERSONAL_DATA_DB_NAME')
+        pool_size = int(os.environ.get('PERSONAL_DATA_DB_POOL_SIZE',
+                                       DB_POOL_SIZE))
+        _db_pool = ConnectionPool(
+            pool_size,
+            host=db_host,
+            database=db_nm,
+            user=db_username,
+            password=db_paswd)
+    return _db_pool.get_connection()
+
+
+def users_query(fields: Tuple[str, ...] = PII_FIELDS,
+                omit: bool = False) -> Tuple[Tuple[str, ...], str]:
+    """ Builds the SELECT for the users table with the PII pushed down.
+    Redacted columns come back as the redaction literal, or are left out
+    of the projection with omit. Returns the result columns and the query.
+    """
+    columns = []
+    projection = []
+    for column in USER_COLUMNS:
+        if column not in fields:
+            columns.append(column)
+            projection.append("`{}`".format(column))
+        elif not omit:
+            columns.append(column)
+            projection.append("'{}' AS `{}`".format(
+                RedactingFormatter.REDACTION, column))
+    query = "SELECT {} FROM users".format(", ".join(projection))
+    return tuple(columns), query
+
+
+def fetch_batches(cursor, batch_size: int) -> Iterator[List[tuple]]:
+    """ Yields the rows of an executed cursor batch_size rows at a time.
     """
-    db_paswd = os.environ.get("PERSONAL_DATA_DB_PASSWORD", "")
-    db_username = os.environ.get('PERSONAL_DATA_DB_USERNAME', "root")
-    db_host = os.environ.get('PERSONAL_DATA_DB_HOST', 'localhost')
-    db_nm = os.environ.get('PERSONAL_DATA_DB_NAME')
-    conection = mysql.connector.connect(
-        host=db_host,
-        database=db_nm,
-        user=db_username,
-        password=db_paswd)
-    return conection
+    while True:
+        rows = cursor.fetchmany(batch_size)
+        if not rows:
+            return
+        yield rows
 
 
 def main() -> None:
     """ Main function that retrieves and prints user data from database.
     """
     logger = get_logger()
-    datab = get_db()
-    db_cursor = datab.cursor()
-    db_cursor.execute("SELECT * FROM users;")
-
-    for us_rw in db_cursor:
-        us_dict = {
-            "name": us_rw[0],
-            "email": us_rw[1],
-            "phone": us_rw[2],
-            "ssn": us_rw[3],
-            "password": us_rw[4],
-            "ip": us_rw[5],
-            "last_login": us_rw[6],
-            "user_agent": us_rw[7]
-        }
-        message = "; ".join(f"{key}={value}" for key, value in us_dict.items())
-        logger.info(message)
-
-    db_cursor.close()
-    datab.close()
+    batch_size = int(os.environ.get('PERSONAL_DATA_DB_BATCH_SIZE',
+                                    DB_BATCH_SIZE))
+    columns, query = users_query()
+    with get_db() as datab:
+        db_cursor = datab.cursor(buffered=False)
+        try:
+            db_cursor.execute(query + ";")
+            for batch in fetch_batches(db_cursor, batch_size):
+                for us_rw in batch:
+                    logger.info("", extra={"row": dict(zip(columns, us_rw))})
+        finally:
+            db_cursor.close()
 
 
 if __name__ == '__main__':
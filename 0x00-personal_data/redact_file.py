@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+Bulk redaction of log files
+"""
+
+import argparse
+import mmap
+import os
+import sys
+import time
+from multiprocessing import Pool
+from typing import List, Tuple
+
+from filtered_logger import PII_FIELDS, RedactingFormatter, filter_datum
+
+
+CHUNK_SIZE = 8 * 1024 * 1024
+
+
+def chunk_ranges(file_path: str, chunk_size: int) -> List[Tuple[int, int]]:
+    """ Splits a file into (start, end) byte ranges ending on a newline.
+    """
+    size = os.path.getsize(file_path)
+    if size == 0:
+        return []
+    ranges = []
+    with open(file_path, 'rb') as f, \
+            mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        start = 0
+        while start < size:
+            end = mm.find(b'\n', min(start + chunk_size, size) - 1)
+            end = size if end == -1 else end + 1
+            ranges.append((start, end))
+            start = end
+    return ranges
+
+
+def redact_chunk(job: Tuple[str, int, int, tuple, str, str]) -> bytes:
+    """ Reads one byte range of the file and returns it redacted.
+    """
+    file_path, start, end, fields, redaction, separator = job
+    with open(file_path, 'rb') as f:
+        f.seek(start)
+        data = f.read(end - start)
+    text = data.decode('utf-8', 'surrogateescape')
+    text = filter_datum(fields, redaction, text, separator)
+    return text.encode('utf-8', 'surrogateescape')
+
+
+def redact_file(input_path: str, output_path: str, fields: tuple,
+                redaction: str, separator: str, workers: int = None,
+                chunk_size: int = CHUNK_SIZE) -> int:
+    """ Redacts input_path into output_path in parallel, keeping line order.
+    Returns the number of bytes read.
+    """
+    ranges = chunk_ranges(input_path, chunk_size)
+    jobs = [(input_path, start, end, fields, redaction, separator)
+            for start, end in ranges]
+    with open(output_path, 'wb') as out:
+        if len(jobs) <= 1 or workers == 1:
+            for job in jobs:
+                out.write(redact_chunk(job))
+        else:
+            with Pool(workers) as pool:
+                for data in pool.imap(redact_chunk, jobs):
+                    out.write(data)
+    return ranges[-1][1] if ranges else 0
+
+
+def main() -> None:
+    """ Command line entry point.
+    """
+    parser = argparse.ArgumentParser(description=__doc__.strip())
+    parser.add_argument('input', help="log file to redact")
+    parser.add_argument('output', help="where to write the redacted log")
+    parser.add_argument('-w', '--workers', type=int, default=os.cpu_count(),
+                        help="number of worker processes")
+    parser.add_argument('-c', '--chunk-size', type=int, default=CHUNK_SIZE,
+                        help="approximate chunk size in bytes")
+    parser.add_argument('-f', '--fields', default=",".join(PII_FIELDS),
+                        help="comma separated list of fields to redact")
+    parser.add_argument('-s', '--separator',
+                        default=RedactingFormatter.SEPARATOR)
+    parser.add_argument('-r', '--redaction',
+                        default=RedactingFormatter.REDACTION)
+    args = parser.parse_args()
+
+    fields = tuple(fld for fld in args.fields.split(",") if fld)
+    start = time.perf_counter()
+    size = redact_file(args.input, args.output, fields, args.redaction,
+                       args.separator, args.workers, args.chunk_size)
+    elapsed = time.perf_counter() - start
+    print("{} bytes in {:.2f}s ({:.1f} MB/s, {} workers)".format(
+        size, elapsed, size / (elapsed or 1) / 1e6, args.workers),
+        file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -90,12 +90,8 @@ class BasicAuth(Auth):
         if user_pwd is None or not isinstance(user_pwd, str):
             return None
         try:
-            Usrs = User.search({'email': user_email})
-            if not Usrs or Usrs == []:
-                return None
-            for Us in Usrs:
-                if Us.is_valid_password(user_pwd):
-                    return Us
-            return None
+            return User.query().where(
+                lambda Us: Us.is_valid_password(user_pwd),
+                email=user_email).first()
         except Exception:
             return None
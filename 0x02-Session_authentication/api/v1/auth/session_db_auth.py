@@ -28,27 +28,27 @@ class SessionDBAuth(SessionExpAuth):
         """Get user ID for a session.
         """
         try:
-            sessi = UserSession.search({'session_id': session_id})
+            sessi = UserSession.query().where(session_id=session_id).first()
         except Exception:
             return None
-        if len(sessi) <= 0:
+        if sessi is None:
             return None
         cr_tm = datetime.now()
         tm_sp = timedelta(seconds=self.session_duration)
-        ex_tm = sessi[0].created_at + tm_sp
+        ex_tm = sessi.created_at + tm_sp
         if ex_tm < cr_tm:
             return None
-        return sessi[0].user_id
+        return sessi.user_id
 
     def destroy_session(self, request=None) -> bool:
         """Destroy a session.
         """
         session_id = self.session_cookie(request)
         try:
-            sessi = UserSession.search({'session_id': session_id})
+            sessi = UserSession.query().where(session_id=session_id).first()
         except Exception:
             return False
-        if len(sessi) <= 0:
+        if sessi is None:
             return False
-        sessi[0].remove()
+        sessi.remove()
         return True
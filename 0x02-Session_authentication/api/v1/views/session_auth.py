@@ -23,15 +23,15 @@ def login() -> Tuple[str, int]:
     if password is None or len(password.strip()) == 0:
         return jsonify({"error": "password missing"}), 400
     try:
-        users = User.search({'email': email})
+        user = User.query().where(email=email).first()
     except Exception:
         return jsonify(not_found_res), 404
-    if len(users) <= 0:
+    if user is None:
         return jsonify(not_found_res), 404
-    if users[0].is_valid_password(password):
+    if user.is_valid_password(password):
         from api.v1.app import auth
-        sessiond_id = auth.create_session(getattr(users[0], 'id'))
-        res = jsonify(users[0].to_json())
+        sessiond_id = auth.create_session(getattr(user, 'id'))
+        res = jsonify(user.to_json())
         res.set_cookie(os.getenv("SESSION_NAME"), sessiond_id)
         return res
     return jsonify({"error": "wrong password"}), 401
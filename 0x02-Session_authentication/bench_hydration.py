@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+Benchmark of LOAD_TYPE: load time, memory held after the load and random
+get() time of eager loading, lazy loading and lazy loading with an LRU
+cache of hydrated objects
+"""
+
+import os
+import random
+import subprocess
+import sys
+import tempfile
+
+MODES = {
+    'eager': {"LOAD_TYPE": "eager"},
+    'lazy': {"LOAD_TYPE": "lazy"},
+    'lazy+lru': {"LOAD_TYPE": "lazy", "HYDRATED_CACHE_SIZE": "1000"},
+}
+
+
+def create(count: int):
+    """ Save count users in .db_User.json of the current directory """
+    from models.base import Base
+    from models.user import User
+    with Base.batch():
+        for i in range(count):
+            user = User(email="user{}@example.com".format(i),
+                        first_name="First{}".format(i),
+                        last_name="Last{}".format(i))
+            user.password = "pwd{}".format(i)
+            user.save()
+
+
+def measure(gets: int):
+    """ Print load seconds, bytes held after the load, and seconds for
+    gets random get() then for the same gets again """
+    import time
+    import tracemalloc
+    from models.user import User
+    tracemalloc.start()
+    start = time.perf_counter()
+    User.load_from_file()
+    load = time.perf_counter() - start
+    held = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    ids = list(User.storage().objects)
+    picked = random.Random(0).choices(ids, k=gets)
+    times = []
+    for _ in range(2):
+        start = time.perf_counter()
+        for obj_id in picked:
+            User.get(obj_id)
+        times.append(time.perf_counter() - start)
+    print(load, held, *times)
+
+
+if __name__ == '__main__':
+    if sys.argv[1:2] == ['--measure']:
+        measure(int(sys.argv[2]))
+        sys.exit(0)
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    gets = int(sys.argv[2]) if len(sys.argv) > 2 else 10000
+    here = os.path.dirname(os.path.abspath(__file__))
+    with tempfile.TemporaryDirectory() as directory:
+        env = dict(os.environ, PYTHONPATH=here, STORAGE_TYPE="json")
+        env.pop("HYDRATED_CACHE_SIZE", None)
+        subprocess.run([sys.executable, "-c",
+                        "import bench_hydration; "
+                        "bench_hydration.create({})".format(count)],
+                       cwd=directory, env=env, check=True)
+        # lazy loads read offsets from .db_User.idx: write it beforehand
+        subprocess.run([sys.executable, "-c",
+                        "from models.user import User; "
+                        "User.load_from_file()"], cwd=directory,
+                       env=dict(env, LOAD_TYPE="lazy"), check=True)
+        print("{:,} users, {:,} random get()".format(count, gets))
+        for mode, settings in MODES.items():
+            # a fresh process per mode, so that every load starts cold
+            out = subprocess.run(
+                [sys.executable, os.path.join(here, "bench_hydration.py"),
+                 "--measure", str(gets)], cwd=directory, check=True,
+                env=dict(env, **settings), stdout=subprocess.PIPE)
+            load, held, cold, warm = map(float, out.stdout.split())
+            print("  {:<9} load {:7.3f}s  held {:>12,.0f} B  get {:6.3f}s"
+                  "  again {:6.3f}s".format(mode, load, held, cold, warm))
@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+Memory benchmark of User/UserSession: __dict__ instances against slots
+"""
+
+import gc
+import json
+import sys
+import tracemalloc
+import uuid
+from datetime import datetime
+
+from models.user import User
+from models.user_session import UserSession
+
+
+TIMESTAMP_FORMAT = "%Y-%m-%dT%H:%M:%S"
+
+
+class LegacyBase():
+    """ Original layout: a __dict__ per instance, ids not shared. """
+
+    def __init__(self, **kwargs: dict):
+        """ Same attributes as Base.__init__ """
+        self.id = kwargs.get('id', str(uuid.uuid4()))
+        self.created_at = datetime.strptime(kwargs.get('created_at'),
+                                            TIMESTAMP_FORMAT)
+        self.updated_at = datetime.strptime(kwargs.get('updated_at'),
+                                            TIMESTAMP_FORMAT)
+
+
+class LegacyUser(LegacyBase):
+    """ User before __slots__ """
+
+    def __init__(self, **kwargs: dict):
+        """ Same attributes as User.__init__ """
+        super().__init__(**kwargs)
+        self.email = kwargs.get('email')
+        self._password = kwargs.get('_password')
+        self.first_name = kwargs.get('first_name')
+        self.last_name = kwargs.get('last_name')
+
+
+class LegacyUserSession(LegacyBase):
+    """ UserSession before __slots__ """
+
+    def __init__(self, **kwargs: dict):
+        """ Same attributes as UserSession.__init__ """
+        super().__init__(**kwargs)
+        self.user_id = kwargs.get('user_id')
+        self.session_id = kwargs.get('session_id')
+
+
+def sample_files(count: int) -> tuple:
+    """ JSON text of count users and count sessions, four per user """
+    users = {}
+    sessions = {}
+    for i in range(count):
+        obj_id = str(uuid.uuid4())
+        users[obj_id] = {
+            'id': obj_id, 'created_at': "2023-01-02T03:04:05",
+            'updated_at': "2023-01-02T03:04:05",
+            'email': "user{}@example.com".format(i),
+            '_password': "{:064x}".format(i),
+            'first_name': "First{}".format(i), 'last_name': "Last{}".format(i),
+        }
+    user_ids = list(users)
+    for i in range(count):
+        obj_id = str(uuid.uuid4())
+        sessions[obj_id] = {
+            'id': obj_id, 'created_at': "2023-01-02T03:04:05",
+            'updated_at': "2023-01-02T03:04:05",
+            'user_id': user_ids[i // 4], 'session_id': str(uuid.uuid4()),
+        }
+    return json.dumps(users), json.dumps(sessions)
+
+
+def bytes_per_object(cls, text: str, key_by_id: bool) -> float:
+    """ Memory kept per object after loading text the way load_from_file
+    does; key_by_id keys the dict with obj.id as FileStorage.load does
+    """
+    gc.collect()
+    tracemalloc.start()
+    objs_json = json.loads(text)
+    objs = {}
+    for obj_id, obj_json in objs_json.items():
+        obj = cls(**obj_json)
+        objs[obj.id if key_by_id else obj_id] = obj
+    del objs_json, obj_json
+    gc.collect()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return size / len(objs)
+
+
+if __name__ == '__main__':
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    users, sessions = sample_files(count)
+    for name, legacy, cls, text in (
+            ("User", LegacyUser, User, users),
+            ("UserSession", LegacyUserSession, UserSession, sessions)):
+        old = bytes_per_object(legacy, text, False)
+        new = bytes_per_object(cls, text, True)
+        print("{:<12} __dict__: {:>6.0f} B/obj  slots: {:>6.0f} B/obj "
+              "({:.0f}% less)".format(name, old, new, 100 - 100 * new / old))
@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+"""
+Benchmark of the snapshot formats: save time, load time and file size
+"""
+
+import os
+import sys
+import tempfile
+import time
+from typing import List
+
+from models.serializer import SERIALIZERS
+from models.user import User
+
+
+def sample_users(count: int) -> List[User]:
+    """ Users with every attribute set. """
+    users = []
+    for i in range(count):
+        user = User(email="user{}@example.com".format(i),
+                    first_name="First{}".format(i),
+                    last_name="Last{}".format(i))
+        user.password = "pwd{}".format(i)
+        users.append(user)
+    return users
+
+
+def run(fmt: str, users: List[User], directory: str) -> tuple:
+    """ Save, decode and load (decode plus User objects) seconds, and
+    file size, of users in format fmt. """
+    serializer = SERIALIZERS[fmt]
+    file_path = os.path.join(directory, "users" + serializer.extension)
+    for user in users:
+        user._json_cache = None
+    start = time.perf_counter()
+    with open(file_path, 'w' + serializer.mode) as f:
+        serializer.dump([(user.id, user) for user in users], f)
+    save = time.perf_counter() - start
+
+    start = time.perf_counter()
+    with open(file_path, 'r' + serializer.mode) as f:
+        list(serializer.load(f))
+    decode = time.perf_counter() - start
+
+    start = time.perf_counter()
+    with open(file_path, 'r' + serializer.mode) as f:
+        loaded = {}
+        for obj_json in serializer.load(f):
+            obj = User(**obj_json)
+            loaded[obj.id] = obj
+    load = time.perf_counter() - start
+    assert len(loaded) == len(users)
+    return save, decode, load, os.path.getsize(file_path)
+
+
+if __name__ == '__main__':
+    counts = [int(n) for n in sys.argv[1:]] or [10000, 100000]
+    with tempfile.TemporaryDirectory() as directory:
+        for count in counts:
+            users = sample_users(count)
+            print("{:,} objects".format(count))
+            results = {fmt: run(fmt, users, directory)
+                       for fmt in ('json', 'binary')}
+            for fmt, (save, decode, load, size) in results.items():
+                print("  {:<6} save {:7.3f}s  decode {:7.3f}s  load {:7.3f}s"
+                      "  {:>12,} B".format(fmt, save, decode, load, size))
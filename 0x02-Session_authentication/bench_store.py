@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+Benchmark of the in-memory store of a class under threads: plain dict,
+dict behind one lock with snapshot copies, and ShardedStore
+"""
+
+import sys
+import threading
+import time
+from typing import Callable
+
+from models.shards import ShardedStore, StoreView
+
+
+class LockedDict():
+    """ dict behind one lock, with the view() of ShardedStore: a frozen
+    copy of the whole dict, made on the first view after a write. """
+
+    def __init__(self):
+        """ Empty store """
+        self._data = {}
+        self._lock = threading.Lock()
+        self._view = None
+
+    def get(self, key, default=None):
+        """ Read without locking """
+        return self._data.get(key, default)
+
+    def __setitem__(self, key, value):
+        """ Write under the lock """
+        with self._lock:
+            self._data[key] = (0, key, value)
+            self._view = None
+
+    def pop(self, key, *default):
+        """ Remove under the lock """
+        with self._lock:
+            self._view = None
+            return self._data.pop(key, *default)
+
+    def view(self) -> StoreView:
+        """ Frozen copy, made under the lock when there is none """
+        view = self._view
+        if view is None:
+            with self._lock:
+                if self._view is None:
+                    self._view = StoreView((dict(self._data),))
+                view = self._view
+        return view
+
+    def items(self) -> list:
+        """ Snapshot of the pairs """
+        return self.view().items()
+
+
+class PlainDict(dict):
+    """ The original store: a dict iterated as save_to_file did. """
+
+    def view(self) -> dict:
+        """ No snapshot: readers see the live dict """
+        return self
+
+    def items(self) -> list:
+        """ Iterate while other threads write, like the original
+        save_to_file loop """
+        return [(key, value) for key, value in dict.items(self)]
+
+
+def worker(store, thread_id: int, ops: int, errors: list):
+    """ Write-heavy mix: 60% saves, 30% reads through a view as searches
+    do, 10% removes, and a snapshot every 10000 operations, as a
+    save_to_file would do """
+    keys = ["{}-{}".format(thread_id, i) for i in range(1000)]
+    for i in range(ops):
+        key = keys[i % 1000]
+        op = i % 10
+        try:
+            if op < 6:
+                store[key] = i
+            elif op < 9:
+                store.view().get(key)
+            else:
+                store.pop(key, None)
+            if i % 10000 == 0:
+                store.items()
+        except RuntimeError:
+            errors.append(i)
+
+
+def ops_per_sec(factory: Callable, threads: int, ops: int,
+                size: int) -> tuple:
+    """ Throughput of threads workers on one store of size objects, and
+    error count """
+    store = factory()
+    for i in range(size):
+        store["seed-{}".format(i)] = i
+    errors = []
+    workers = [threading.Thread(target=worker,
+                                args=(store, n, ops, errors))
+               for n in range(threads)]
+    start = time.perf_counter()
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    return threads * ops / (time.perf_counter() - start), len(errors)
+
+
+if __name__ == '__main__':
+    ops = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    sizes = [int(n) for n in sys.argv[2:]] or [1000, 10000, 100000]
+    print("GIL enabled: {}".format(getattr(sys, '_is_gil_enabled',
+                                           lambda: True)()))
+    for size in sizes:
+        print("{:,} objects".format(size))
+        for threads in (1, 2, 4, 8):
+            line = "  {} threads".format(threads)
+            for name, factory in (("dict", PlainDict),
+                                  ("locked", LockedDict),
+                                  ("sharded", ShardedStore)):
+                rate, errors = ops_per_sec(factory, threads,
+                                           ops // threads, size)
+                line += "  {}: {:>9,.0f} ops/s ({} err)".format(
+                    name, rate, errors)
+            print(line)
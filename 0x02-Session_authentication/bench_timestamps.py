@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""
+Benchmark of User load and to_json: strptime/strftime against the
+fromisoformat/isoformat codec of models.base
+"""
+
+import sys
+import time
+from datetime import datetime
+from typing import Callable, List
+
+import models.base
+from models.base import TIMESTAMP_FORMAT
+from models.user import User
+
+
+def legacy_parse(value: str) -> datetime:
+    """ Original parsing: strptime. """
+    return datetime.strptime(value, TIMESTAMP_FORMAT)
+
+
+def legacy_format(value: datetime) -> str:
+    """ Original formatting: strftime. """
+    return value.strftime(TIMESTAMP_FORMAT)
+
+
+def sample_users(count: int) -> List[dict]:
+    """ Serialized users as load_from_file reads them. """
+    return [{
+        'id': "{:032x}".format(i),
+        'created_at': "2023-01-02T03:{:02d}:{:02d}".format(
+            i // 60 % 60, i % 60),
+        'updated_at': "2023-06-07T08:{:02d}:{:02d}".format(
+            i // 60 % 60, i % 60),
+        'email': "user{}@example.com".format(i),
+    } for i in range(count)]
+
+
+def objs_per_sec(func: Callable, items: list) -> float:
+    """ Runs func over every item and returns the throughput. """
+    start = time.perf_counter()
+    for item in items:
+        func(item)
+    return len(items) / (time.perf_counter() - start)
+
+
+def run(parse: Callable, fmt: Callable, users: List[dict]) -> tuple:
+    """ Load and serialize throughput with the given codec. """
+    models.base.parse_timestamp = parse
+    models.base.format_timestamp = fmt
+    load = objs_per_sec(lambda kwargs: User(**kwargs), users)
+    objs = [User(**kwargs) for kwargs in users]
+    dump = objs_per_sec(lambda obj: obj.to_json(True), objs)
+    return load, dump, [obj.to_json(True) for obj in objs[:100]]
+
+
+if __name__ == '__main__':
+    users = sample_users(int(sys.argv[1]) if len(sys.argv) > 1 else 100000)
+    fast = (models.base.parse_timestamp, models.base.format_timestamp)
+    old_load, old_dump, old_json = run(legacy_parse, legacy_format, users)
+    new_load, new_dump, new_json = run(*fast, users)
+    assert old_json == new_json
+    print("load     strptime: {:>10,.0f} obj/sec  fromisoformat: "
+          "{:>10,.0f} obj/sec ({:.2f}x)".format(old_load, new_load,
+                                                new_load / old_load))
+    print("to_json  strftime: {:>10,.0f} obj/sec  isoformat:     "
+          "{:>10,.0f} obj/sec ({:.2f}x)".format(old_dump, new_dump,
+                                                new_dump / old_dump))
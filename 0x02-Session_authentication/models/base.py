@@ -1,40 +1,100 @@
 #!/usr/bin/env python3
 """ Base module
 """
+from contextlib import contextmanager
 from datetime import datetime
 from typing import TypeVar, List, Iterable
-from os import path
 import json
+import sys
 import uuid
 
+from models.query import Query
+from models.storage import (STORAGE_TYPE, FileStorage, Storage,
+                            current_batch, flush, set_batch)
+
 
 TIMESTAMP_FORMAT = "%Y-%m-%dT%H:%M:%S"
-DATA = {}
+STORAGES = {}
+
+
+def parse_timestamp(value: str) -> datetime:
+    """ Parse a TIMESTAMP_FORMAT string
+    fromisoformat is a lot faster than strptime and reads the same
+    format; other lengths go through strptime to keep its errors.
+    """
+    if type(value) is str and len(value) == 19 and value[10] == 'T' \
+            and value[13] == ':' and value[16] == ':':
+        return datetime.fromisoformat(value)
+    return datetime.strptime(value, TIMESTAMP_FORMAT)
+
+
+def format_timestamp(value: datetime) -> str:
+    """ Format a datetime as TIMESTAMP_FORMAT
+    """
+    if value.tzinfo is None and value.year >= 1000:
+        return value.isoformat(timespec='seconds')
+    return value.strftime(TIMESTAMP_FORMAT)
+
+
+def intern_id(value):
+    """ Share one string object between every copy of an id
+    """
+    return sys.intern(value) if type(value) is str else value
 
 
 class Base():
     """ Base class
+
+    Attributes live in __slots__: subclasses list theirs in __slots__ too,
+    and FIELDS (every slot, in declaration order) drives to_json.
+    The JSON of the object is cached until one of its attributes is set;
+    values mutated in place (a list appended to) are not noticed.
     """
 
+    __slots__ = ('id', 'created_at', 'updated_at', '_json_cache')
+    INDEXED_ATTRIBUTES = ()
+    FIELDS = ('id', 'created_at', 'updated_at')
+
+    def __init_subclass__(cls, **kwargs):
+        """ Collect the slots of cls and its parents into FIELDS
+        """
+        super().__init_subclass__(**kwargs)
+        fields = list(Base.FIELDS)
+        for klass in reversed(cls.__mro__[:cls.__mro__.index(Base)]):
+            for key in klass.__dict__.get('__slots__', ()):
+                if key not in ('__dict__', '__weakref__') and \
+                        key not in fields:
+                    fields.append(key)
+        cls.FIELDS = tuple(fields)
+
     def __init__(self, *args: list, **kwargs: dict):
         """ Initialize a Base instance
         """
-        s_class = str(self.__class__.__name__)
-        if DATA.get(s_class) is None:
-            DATA[s_class] = {}
-
-        self.id = kwargs.get('id', str(uuid.uuid4()))
+        obj_id = kwargs.get('id')
+        if obj_id is None and 'id' not in kwargs:
+            obj_id = str(uuid.uuid4())
+        self.id = intern_id(obj_id)
         if kwargs.get('created_at') is not None:
-            self.created_at = datetime.strptime(kwargs.get('created_at'),
-                                                TIMESTAMP_FORMAT)
+            self.created_at = parse_timestamp(kwargs.get('created_at'))
         else:
             self.created_at = datetime.utcnow()
         if kwargs.get('updated_at') is not None:
-            self.updated_at = datetime.strptime(kwargs.get('updated_at'),
-                                                TIMESTAMP_FORMAT)
+            self.updated_at = parse_timestamp(kwargs.get('updated_at'))
         else:
             self.updated_at = datetime.utcnow()
 
+    def __setattr__(self, name: str, value):
+        """ Set an attribute and drop the cached JSON
+        Indexes of the storage follow the new value of indexed attributes.
+        """
+        object.__setattr__(self, name, value)
+        if name != '_json_cache':
+            object.__setattr__(self, '_json_cache', None)
+            if name in self.INDEXED_ATTRIBUTES:
+                storage = STORAGES.get(self.__class__.__name__)
+                if storage is not None:
+                    storage.changed(self, name)
+
     def __eq__(self, other: TypeVar('Base')) -> bool:
         """ Equality
         """
@@ -44,69 +104,150 @@ class Base():
             return False
         return (self.id == other.id)
 
+    def _json(self, key: tuple, build):
+        """ Cached value for key, built by build() on a miss
+        """
+        cache = getattr(self, '_json_cache', None)
+        if cache is None:
+            cache = {}
+            object.__setattr__(self, '_json_cache', cache)
+        value = cache.get(key)
+        if value is None:
+            value = cache[key] = build()
+        return value
+
     def to_json(self, for_serialization: bool = False) -> dict:
         """ Convert the object a JSON dictionary
         """
+        return dict(self._json(('dict', for_serialization),
+                               lambda: self._to_json(for_serialization)))
+
+    def to_json_string(self, for_serialization: bool = False) -> str:
+        """ to_json encoded with json.dumps
+        """
+        return self._json(('str', for_serialization),
+                          lambda: json.dumps(self.to_json(for_serialization)))
+
+    def _to_json(self, for_serialization: bool) -> dict:
+        """ Build the JSON dictionary of the object
+        """
         result = {}
-        for key, value in self.__dict__.items():
+        items = [(key, getattr(self, key)) for key in self.FIELDS]
+        if hasattr(self, '__dict__'):
+            items.extend(self.__dict__.items())
+        for key, value in items:
             if not for_serialization and key[0] == '_':
                 continue
             if type(value) is datetime:
-                result[key] = value.strftime(TIMESTAMP_FORMAT)
+                result[key] = format_timestamp(value)
             else:
                 result[key] = value
         return result
 
     @classmethod
-    def load_from_file(cls):
-        """ Load all objects from file
+    def storage(cls) -> Storage:
+        """ Storage of the class, picked by STORAGE_TYPE
         """
         s_class = cls.__name__
-        file_path = ".db_{}.json".format(s_class)
-        DATA[s_class] = {}
-        if not path.exists(file_path):
-            return
+        if STORAGES.get(s_class) is None:
+            if STORAGE_TYPE == "sqlite":
+                from models.sqlite_storage import SQLiteStorage
+                STORAGES[s_class] = SQLiteStorage(cls)
+            else:
+                STORAGES[s_class] = FileStorage(cls)
+        return STORAGES[s_class]
 
-        with open(file_path, 'r') as f:
-            objs_json = json.load(f)
-            for obj_id, obj_json in objs_json.items():
-                DATA[s_class][obj_id] = cls(**obj_json)
+    @classmethod
+    def load_from_file(cls):
+        """ Load all objects from file
+        """
+        cls.storage().load()
 
     @classmethod
     def save_to_file(cls):
         """ Save all objects to file
         """
-        s_class = cls.__name__
-        file_path = ".db_{}.json".format(s_class)
-        objs_json = {}
-        for obj_id, obj in DATA[s_class].items():
-            objs_json[obj_id] = obj.to_json(True)
+        cls.storage().save_all()
 
-        with open(file_path, 'w') as f:
-            json.dump(objs_json, f)
+    @staticmethod
+    def flush():
+        """ Write the changes of every class still waiting for the
+        write-behind flusher (FLUSH_INTERVAL)
+        """
+        flush()
 
     def save(self):
         """ Save current object
         """
-        s_class = self.__class__.__name__
         self.updated_at = datetime.utcnow()
-        DATA[s_class][self.id] = self
-        self.__class__.save_to_file()
+        self.__class__.storage().save(self)
 
     def remove(self):
         """ Remove object
         """
-        s_class = self.__class__.__name__
-        if DATA[s_class].get(self.id) is not None:
-            del DATA[s_class][self.id]
-            self.__class__.save_to_file()
+        self.__class__.storage().remove(self)
+
+    @staticmethod
+    @contextmanager
+    def batch():
+        """ Buffer saves and removals of every class, and write each
+        touched class once when the block exits.
+        If the block raises, every touched storage rolls back to its
+        state from before the batch. With the JSON storage, saves and
+        removals of other threads wait for the batch to end.
+        """
+        if current_batch() is not None:
+            yield
+            return
+        # files waiting for the flusher must hold the state to roll back to
+        flush()
+        set_batch({})
+        try:
+            yield
+        except BaseException:
+            batch = current_batch()
+            set_batch(None)
+            try:
+                for storage, pending in batch.items():
+                    storage.rollback(pending)
+            finally:
+                for storage in batch:
+                    storage.end()
+            raise
+        batch = current_batch()
+        set_batch(None)
+        try:
+            for storage, pending in batch.items():
+                storage.commit(pending)
+        finally:
+            for storage in batch:
+                storage.end()
+
+    @classmethod
+    def bulk_save(cls, objs: Iterable[TypeVar('Base')]):
+        """ Save many objects with a single write per class
+        """
+        by_storage = {}
+        for obj in objs:
+            obj.updated_at = datetime.utcnow()
+            by_storage.setdefault(obj.__class__.storage(), []).append(obj)
+        with Base.batch():
+            for storage, storage_objs in by_storage.items():
+                storage.save_many(storage_objs)
+
+    @classmethod
+    def bulk_remove(cls, objs: Iterable[TypeVar('Base')]):
+        """ Remove many objects with a single write per class
+        """
+        with Base.batch():
+            for obj in objs:
+                obj.remove()
 
     @classmethod
     def count(cls) -> int:
         """ Count all objects
         """
-        s_class = cls.__name__
-        return len(DATA[s_class].keys())
+        return cls.storage().count()
 
     @classmethod
     def all(cls) -> Iterable[TypeVar('Base')]:
@@ -118,20 +259,18 @@ class Base():
     def get(cls, id: str) -> TypeVar('Base'):
         """ Return one object by ID
         """
-        s_class = cls.__name__
-        return DATA[s_class].get(id)
+        return cls.storage().get(id)
 
     @classmethod
     def search(cls, attributes: dict = {}) -> List[TypeVar('Base')]:
         """ Search all objects with matching attributes
+        Objects in memory are matched on their current values, saved or
+        not. With STORAGE_TYPE 'sqlite', the saved values are matched.
         """
-        s_class = cls.__name__
-        def _search(obj):
-            if len(attributes) == 0:
-                return True
-            for k, v in attributes.items():
-                if (getattr(obj, k) != v):
-                    return False
-            return True
-        
-        return list(filter(_search, DATA[s_class].values()))
+        return cls.storage().search(attributes)
+
+    @classmethod
+    def query(cls) -> Query:
+        """ Lazy query on the objects of the class, see models.query
+        """
+        return Query(cls)
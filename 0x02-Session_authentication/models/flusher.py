@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+""" Flusher module
+"""
+import atexit
+import threading
+import time
+
+
+class Flusher():
+    """ Write-behind persistence of dirty storages
+
+    mark() only records that a storage changed; a background thread
+    calls save_all() on it at most once per interval seconds, so requests
+    do not wait for the disk.
+
+    Data-loss window: writes made in the last interval seconds, plus the
+    duration of one save_all, are lost if the process dies without
+    running its atexit hooks (SIGKILL, crash, os._exit, or SIGTERM
+    without a handler). A normal exit runs flush().
+
+    lock, if given, is held around every flush, before the flusher's own
+    lock: storages that take it in save_all can then hold it while
+    flushing without a lock-order inversion.
+    """
+
+    def __init__(self, interval: float, lock=None):
+        """ Initialize a flusher writing every interval seconds
+        """
+        self.interval = interval
+        self._outer_lock = lock if lock is not None else threading.RLock()
+        self._dirty = {}
+        self._cond = threading.Condition()
+        self._flush_lock = threading.Lock()
+        self._thread = None
+
+    def mark(self, storage):
+        """ Schedule storage.save_all()
+        """
+        with self._cond:
+            self._dirty[storage] = None
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run,
+                                                daemon=True)
+                self._thread.start()
+                atexit.register(self.flush)
+            self._cond.notify()
+
+    def is_dirty(self, storage) -> bool:
+        """ True if storage has changes not written yet
+        """
+        with self._cond:
+            return storage in self._dirty
+
+    def flush(self, storage=None):
+        """ Write storage now, or every dirty storage if None
+        A storage whose save_all fails stays dirty and the error is raised.
+        """
+        with self._outer_lock, self._flush_lock:
+            with self._cond:
+                if storage is None:
+                    dirty = list(self._dirty)
+                    self._dirty.clear()
+                elif storage in self._dirty:
+                    dirty = [storage]
+                    del self._dirty[storage]
+                else:
+                    dirty = []
+            for idx, item in enumerate(dirty):
+                try:
+                    item.save_all()
+                except BaseException:
+                    with self._cond:
+                        for failed in dirty[idx:]:
+                            self._dirty[failed] = None
+                    raise
+
+    def _run(self):
+        """ Wait for changes, let them accumulate for one interval, then
+        write them
+        """
+        while True:
+            with self._cond:
+                while not self._dirty:
+                    self._cond.wait()
+            time.sleep(self.interval)
+            try:
+                self.flush()
+            except Exception:
+                # the storages stay dirty: retried on the next interval
+                pass
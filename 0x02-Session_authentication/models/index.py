@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+""" Index module
+"""
+from typing import Iterable, Optional
+import threading
+
+
+class Index():
+    """ Hash indexes of the objects of one class, one per attribute
+
+    Indexes follow the objects in memory: they are updated by Base.save,
+    Base.remove and Base.load_from_file, and when an indexed attribute
+    of an object in memory is set, under a lock shared by every method.
+    """
+
+    def __init__(self, attributes: Iterable[str]):
+        """ Initialize empty indexes on attributes
+        """
+        self.attributes = tuple(attributes)
+        self.buckets = {attr: {} for attr in self.attributes}
+        self.values = {}
+        self._lock = threading.Lock()
+
+    def add(self, obj):
+        """ Index obj, or move it to the buckets of its new values
+        """
+        values = tuple(getattr(obj, attr, None) for attr in self.attributes)
+        with self._lock:
+            self._add(obj.id, values)
+
+    def _add(self, obj_id: str, values: tuple):
+        """ add, with the lock held
+        """
+        old_values = self.values.get(obj_id)
+        if old_values == values:
+            return
+        if old_values is not None:
+            self._discard(obj_id)
+        for attr, value in zip(self.attributes, values):
+            try:
+                self.buckets[attr].setdefault(value, {})[obj_id] = None
+            except TypeError:
+                # unhashable values are left to the full scan
+                pass
+        self.values[obj_id] = values
+
+    def discard(self, obj_id: str):
+        """ Remove an object id from every index
+        """
+        with self._lock:
+            self._discard(obj_id)
+
+    def _discard(self, obj_id: str):
+        """ discard, with the lock held
+        """
+        values = self.values.pop(obj_id, None)
+        if values is None:
+            return
+        for attr, value in zip(self.attributes, values):
+            try:
+                bucket = self.buckets[attr].get(value)
+            except TypeError:
+                continue
+            if bucket is not None:
+                bucket.pop(obj_id, None)
+                if len(bucket) == 0:
+                    del self.buckets[attr][value]
+
+    def candidates(self, attributes: dict) -> Optional[list]:
+        """ Ids from the smallest bucket matching one of the attributes,
+        or None if no index covers the query
+        """
+        best = None
+        with self._lock:
+            for attr, value in attributes.items():
+                if attr not in self.buckets:
+                    continue
+                try:
+                    bucket = self.buckets[attr].get(value, {})
+                except TypeError:
+                    continue
+                if best is None or len(bucket) < len(best):
+                    best = bucket
+            if best is None:
+                return None
+            return list(best)
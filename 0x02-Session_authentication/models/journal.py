@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+""" Journal module
+"""
+from os import path
+from typing import Iterable, Tuple
+import json
+import os
+import threading
+
+
+class Journal():
+    """ Append-only log of the saves and removals of one class.
+
+    The log is replayed on top of the .db_<Class>.json snapshot at load
+    time, and folded into a fresh snapshot by a background compaction
+    once it grows past max_size bytes.
+    """
+
+    def __init__(self, s_class: str, max_size: int):
+        """ Initialize the journal of a class
+        """
+        self.snapshot_path = ".db_{}.json".format(s_class)
+        self.path = ".db_{}.journal".format(s_class)
+        self.compacting_path = self.path + ".compacting"
+        self.max_size = max_size
+        self._lock = threading.Lock()
+        self._compact_lock = threading.Lock()
+        self._file = None
+        self._compactor = None
+
+    def replay(self) -> dict:
+        """ Return the JSON of every object: snapshot plus journal
+        """
+        with self._compact_lock:
+            return self._replay((self.compacting_path, self.path))
+
+    def _replay(self, log_paths: Tuple[str, ...]) -> dict:
+        """ Apply the logs to the snapshot, while no compaction is moving
+        the files
+        """
+        objs_json = {}
+        if path.exists(self.snapshot_path):
+            with open(self.snapshot_path, 'r') as f:
+                objs_json = json.load(f)
+        for file_path in log_paths:
+            if not path.exists(file_path):
+                continue
+            with open(file_path, 'r') as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        # torn write at the tail of a log
+                        continue
+                    if entry['op'] == 'save':
+                        objs_json[entry['id']] = entry['obj']
+                    else:
+                        objs_json.pop(entry['id'], None)
+        return objs_json
+
+    def needs_recovery(self) -> bool:
+        """ True if a compaction was interrupted before it finished
+        """
+        return path.exists(self.compacting_path)
+
+    def append(self, op: str, obj_id: str, obj_text: str = None):
+        """ Append one 'save' or 'remove' entry to the log
+        """
+        self.extend([(op, obj_id, obj_text)])
+
+    def extend(self, entries: Iterable[Tuple[str, str, str]]):
+        """ Append (op, id, obj_text) entries to the log in one write
+        obj_text is the object already encoded as JSON, or None
+        """
+        lines = []
+        for op, obj_id, obj_text in entries:
+            line = '{{"op": {}, "id": {}'.format(
+                json.dumps(op), json.dumps(obj_id))
+            if obj_text is not None:
+                line += ', "obj": ' + obj_text
+            lines.append(line + "}\n")
+        with self._lock:
+            if self._file is None:
+                self._truncate_torn_line()
+                self._file = open(self.path, 'a')
+            self._file.write("".join(lines))
+            self._file.flush()
+            size = self._file.tell()
+            start = size > self.max_size and (
+                self._compactor is None or not self._compactor.is_alive())
+            if start:
+                self._compactor = threading.Thread(target=self.compact,
+                                                   daemon=True)
+        if start:
+            self._compactor.start()
+
+    def _truncate_torn_line(self):
+        """ Cut the log back to its last complete line
+        A crash in the middle of an append leaves a partial line, which
+        replay skips; appending after it would glue the next entry to it
+        and lose that entry too.
+        """
+        if not path.exists(self.path):
+            return
+        with open(self.path, 'rb+') as f:
+            end = f.seek(0, os.SEEK_END)
+            pos = end
+            while pos > 0:
+                start = max(0, pos - 4096)
+                f.seek(start)
+                chunk = f.read(pos - start)
+                newline = chunk.rfind(b"\n")
+                if newline != -1:
+                    pos = start + newline + 1
+                    break
+                pos = start
+            if pos != end:
+                f.truncate(pos)
+
+    def compact(self):
+        """ Fold the log into a fresh snapshot
+        Only persisted entries are folded, so changes made in memory but
+        not saved never reach the snapshot.
+        """
+        with self._compact_lock:
+            with self._lock:
+                if self._file is not None:
+                    self._file.close()
+                    self._file = None
+                if not path.exists(self.path):
+                    pass
+                elif path.exists(self.compacting_path):
+                    # left over by an interrupted compaction: keep both
+                    with open(self.path, 'r') as src, \
+                            open(self.compacting_path, 'a') as dst:
+                        dst.write("\n" + src.read())
+                    os.remove(self.path)
+                else:
+                    os.replace(self.path, self.compacting_path)
+
+            objs_json = self._replay((self.compacting_path,))
+            tmp_path = self.snapshot_path + ".tmp"
+            with open(tmp_path, 'w') as f:
+                json.dump(objs_json, f)
+            os.replace(tmp_path, self.snapshot_path)
+            if path.exists(self.compacting_path):
+                os.remove(self.compacting_path)
+
+    def close(self):
+        """ Close the log file
+        """
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
@@ -0,0 +1,252 @@
+#!/usr/bin/env python3
+""" Lazy objects module
+"""
+from collections import OrderedDict
+from collections.abc import MutableMapping
+from json.decoder import WHITESPACE, scanstring
+from os import path
+from types import SimpleNamespace
+from typing import Iterator
+import json
+import mmap
+import os
+import threading
+
+
+class LazyObjects(MutableMapping):
+    """ id -> object mapping over a .db_<Class>.json file
+
+    At load time only the position of each object in the file is read,
+    from the .db_<Class>.idx side file when it matches the JSON file, or
+    by scanning the JSON otherwise. Objects are built on first access.
+
+    With a cache_size, objects built from the file are kept in an LRU
+    cache of that many objects, and built again from their record once
+    evicted; objects saved since the last save_to_file are always kept.
+    Without one, every object built stays in memory.
+    """
+
+    def __init__(self, cls, file_path: str, cache_size: int = 0):
+        """ Initialize the mapping of cls objects stored in file_path
+        """
+        self.cls = cls
+        self.file_path = file_path
+        self.index_path = path.splitext(file_path)[0] + ".idx"
+        self.cache_size = cache_size
+        self._entries = {}
+        self._cache = OrderedDict()
+        self._source = None
+        self._lock = threading.RLock()
+        self._open()
+
+    def _open(self):
+        """ Map the JSON file and find the position of every object
+        """
+        if not path.exists(self.file_path):
+            return
+        with open(self.file_path, 'rb') as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                raise ValueError("Empty file {}".format(self.file_path))
+            self._source = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        offsets = self._read_index()
+        if offsets is None:
+            offsets = self._scan()
+            self._write_index(offsets)
+        self._entries = offsets
+
+    def _read_index(self) -> dict:
+        """ Positions from the side file, or None if it is missing or
+        does not describe the current JSON file
+        """
+        if not path.exists(self.index_path):
+            return None
+        st = os.stat(self.file_path)
+        with open(self.index_path, 'r') as f:
+            index = json.load(f)
+        if index.get('size') != st.st_size or \
+                index.get('mtime_ns') != st.st_mtime_ns:
+            return None
+        return dict(zip(index['ids'], zip(index['starts'], index['ends'])))
+
+    def _write_index(self, offsets: dict):
+        """ Save the positions next to the JSON file
+        """
+        st = os.stat(self.file_path)
+        index = {
+            'size': st.st_size,
+            'mtime_ns': st.st_mtime_ns,
+            'ids': list(offsets.keys()),
+            'starts': [start for start, _ in offsets.values()],
+            'ends': [end for _, end in offsets.values()],
+        }
+        # other threads and processes may rebuild the same side file
+        tmp_path = "{}.{}.{}.tmp".format(self.index_path, os.getpid(),
+                                         threading.get_ident())
+        with open(tmp_path, 'w') as f:
+            json.dump(index, f)
+        os.replace(tmp_path, self.index_path)
+
+    def _scan(self) -> dict:
+        """ Positions of the objects of the JSON file, found by parsing
+        it without building any object.
+        The file is ASCII (json.dump escapes everything else), so string
+        and byte offsets are the same.
+        """
+        text = self._source[:].decode('ascii')
+        decoder = json.JSONDecoder()
+        offsets = {}
+        idx = WHITESPACE.match(text, 0).end()
+        if text[idx:idx + 1] != '{':
+            raise ValueError("Expecting object in {}".format(self.file_path))
+        idx = WHITESPACE.match(text, idx + 1).end()
+        if text[idx:idx + 1] == '}':
+            return offsets
+        while True:
+            obj_id, idx = scanstring(text, idx + 1)
+            idx = WHITESPACE.match(text, idx).end()
+            idx = WHITESPACE.match(text, idx + 1).end()
+            _, end = decoder.raw_decode(text, idx)
+            offsets[obj_id] = (idx, end)
+            idx = WHITESPACE.match(text, end).end()
+            if text[idx:idx + 1] != ',':
+                return offsets
+            idx = WHITESPACE.match(text, idx + 1).end()
+
+    def _raw(self, entry: tuple) -> str:
+        """ JSON text of an object not built yet
+        """
+        with self._lock:
+            return self._source[entry[0]:entry[1]].decode('ascii')
+
+    def peek(self, obj_id: str):
+        """ The object if it is built, otherwise a namespace with the
+        attributes of its JSON, without building it
+        """
+        entry = self._entries[obj_id]
+        if type(entry) is tuple:
+            obj = self._cache.get(obj_id)
+            if obj is not None:
+                return obj
+            return SimpleNamespace(**json.loads(self._raw(entry)))
+        return entry
+
+    def __getitem__(self, obj_id: str):
+        """ Return the object, building it on first access
+        """
+        entry = self._entries[obj_id]
+        if type(entry) is not tuple:
+            return entry
+        with self._lock:
+            entry = self._entries[obj_id]
+            if type(entry) is not tuple:
+                return entry
+            obj = self._cache.get(obj_id)
+            if obj is not None:
+                self._cache.move_to_end(obj_id)
+                return obj
+            obj = self.cls(**json.loads(self._raw(entry)))
+            if self.cache_size > 0:
+                self._cache_put(obj_id, obj)
+            else:
+                self._entries[obj_id] = obj
+        return obj
+
+    def _cache_put(self, obj_id: str, obj):
+        """ Keep obj in the LRU cache, evicting the oldest objects
+        """
+        self._cache[obj_id] = obj
+        self._cache.move_to_end(obj_id)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    def matching(self, attributes: dict) -> Iterator:
+        """ Objects that may have the attributes, to be checked by the
+        caller. Records whose JSON has another value of the same type
+        for one of the attributes are skipped without building their
+        object.
+        """
+        checks = [(key, value) for key, value in attributes.items()
+                  if type(value) in (str, int, float, bool)]
+        for obj_id in list(self._entries):
+            entry = self._entries.get(obj_id)
+            if type(entry) is tuple and checks and \
+                    obj_id not in self._cache:
+                try:
+                    record = json.loads(self._raw(entry))
+                except ValueError:
+                    # the file was rewritten meanwhile: build the object
+                    record = {}
+                if any(type(record.get(key)) is type(value) and
+                       record.get(key) != value for key, value in checks):
+                    continue
+            obj = self.get(obj_id)
+            if obj is not None:
+                yield obj
+
+    def __setitem__(self, obj_id: str, obj):
+        """ Store an object
+        """
+        with self._lock:
+            self._entries[obj_id] = obj
+            self._cache.pop(obj_id, None)
+
+    def __delitem__(self, obj_id: str):
+        """ Remove an object
+        """
+        with self._lock:
+            del self._entries[obj_id]
+            self._cache.pop(obj_id, None)
+
+    def __contains__(self, obj_id) -> bool:
+        """ Membership without building the object
+        """
+        return obj_id in self._entries
+
+    def __iter__(self):
+        """ Iterate over ids
+        """
+        return iter(list(self._entries))
+
+    def __len__(self) -> int:
+        """ Number of objects
+        """
+        return len(self._entries)
+
+    def save_to_file(self):
+        """ Write every object to the JSON file and its side index.
+        Objects not built yet are copied from the old file as is. With a
+        cache_size, saved objects then move to the LRU cache.
+        """
+        with self._lock:
+            offsets = {}
+            pos = 1
+            tmp_path = self.file_path + ".tmp"
+            with open(tmp_path, 'w') as f:
+                f.write("{")
+                for obj_id, entry in list(self._entries.items()):
+                    if type(entry) is tuple:
+                        raw = self._raw(entry)
+                    else:
+                        raw = entry.to_json_string(True)
+                    head = (", " if pos > 1 else "") + json.dumps(obj_id) \
+                        + ": "
+                    f.write(head)
+                    f.write(raw)
+                    pos += len(head)
+                    offsets[obj_id] = (pos, pos + len(raw))
+                    pos += len(raw)
+                f.write("}")
+            os.replace(tmp_path, self.file_path)
+            self._write_index(offsets)
+
+            if self._source is not None:
+                self._source.close()
+            with open(self.file_path, 'rb') as f:
+                self._source = mmap.mmap(f.fileno(), 0,
+                                         access=mmap.ACCESS_READ)
+            for obj_id, entry in list(self._entries.items()):
+                if type(entry) is tuple:
+                    self._entries[obj_id] = offsets[obj_id]
+                elif self.cache_size > 0:
+                    self._entries[obj_id] = offsets[obj_id]
+                    self._cache_put(obj_id, entry)
@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+""" Query module
+"""
+from itertools import islice
+from typing import Callable, Iterator, List, Optional, TypeVar
+
+
+def _sort_key(obj, attr: str, reverse: bool) -> tuple:
+    """ Sort key of obj on attr, placing None values last in both
+    directions
+    """
+    value = getattr(obj, attr)
+    return ((value is None) != reverse, value)
+
+
+class Query():
+    """ Lazy query on the objects of one Base subclass
+
+    Built with User.query().where(email=...).order_by('-created_at')
+    .limit(50).offset(100); each call returns a new query. Nothing runs
+    until the query is iterated: attribute matches go through the indexes
+    of the storage, and iteration stops as soon as the limit is reached.
+    order_by needs every match before the first result.
+    """
+
+    def __init__(self, cls):
+        """ Initialize a query returning every object of cls
+        """
+        self.cls = cls
+        self._attributes = {}
+        self._predicates = ()
+        self._order = ()
+        self._limit = None
+        self._offset = 0
+
+    def _copy(self, **changes) -> 'Query':
+        """ New query with some settings changed
+        """
+        query = Query(self.cls)
+        query.__dict__.update(self.__dict__)
+        query.__dict__.update(changes)
+        return query
+
+    def where(self, *predicates: Callable[[TypeVar('Base')], bool],
+              **attributes) -> 'Query':
+        """ Keep objects whose attributes equal the keyword arguments and
+        for which every predicate returns True
+        Values are compared as Base.search does: current values of the
+        objects in memory, saved values with STORAGE_TYPE 'sqlite'.
+        """
+        merged = dict(self._attributes)
+        merged.update(attributes)
+        return self._copy(_attributes=merged,
+                          _predicates=self._predicates + predicates)
+
+    def order_by(self, *keys: str) -> 'Query':
+        """ Sort by attributes, descending when prefixed by '-'
+        None values come last.
+        """
+        return self._copy(_order=self._order + keys)
+
+    def limit(self, count: Optional[int]) -> 'Query':
+        """ Return at most count objects
+        """
+        return self._copy(_limit=count)
+
+    def offset(self, count: int) -> 'Query':
+        """ Skip the first count objects
+        """
+        return self._copy(_offset=count)
+
+    def __iter__(self) -> Iterator[TypeVar('Base')]:
+        """ Run the query
+        """
+        objs = self.cls.storage().iterate(self._attributes)
+        for predicate in self._predicates:
+            objs = filter(predicate, objs)
+        if self._order:
+            objs = list(objs)
+            # one stable sort per key, least significant first
+            for key in reversed(self._order):
+                reverse = key.startswith('-')
+                attr = key.lstrip('-')
+                objs.sort(key=lambda obj: _sort_key(obj, attr, reverse),
+                          reverse=reverse)
+        stop = None
+        if self._limit is not None:
+            stop = self._offset + self._limit
+        return islice(objs, self._offset, stop)
+
+    def all(self) -> List[TypeVar('Base')]:
+        """ Every result, as a list
+        """
+        return list(self)
+
+    def first(self) -> Optional[TypeVar('Base')]:
+        """ First result, or None
+        """
+        limit = 1 if self._limit is None else min(1, self._limit)
+        return next(iter(self.limit(limit)), None)
+
+    def exists(self) -> bool:
+        """ True if there is at least one result
+        """
+        return self.first() is not None
+
+    def count(self) -> int:
+        """ Number of results
+        """
+        return sum(1 for _ in self)
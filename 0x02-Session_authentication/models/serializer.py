@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+""" Snapshot serializer module
+"""
+from typing import IO, Iterable, Iterator, Tuple
+import json
+import pickle
+import struct
+
+
+class JSONSerializer():
+    """ .db_<Class>.json: one JSON object of id -> to_json(True)
+    """
+
+    extension = ".json"
+    mode = ""
+
+    def dump(self, items: Iterable[Tuple[str, object]], f: IO):
+        """ Write the (id, object) items
+        Same text as json.dump of the to_json dicts, from cached strings.
+        """
+        f.write("{" + ", ".join(
+            json.dumps(obj_id) + ": " + obj.to_json_string(True)
+            for obj_id, obj in items) + "}")
+
+    def load(self, f: IO) -> Iterator[dict]:
+        """ Return the to_json(True) dict of every object
+        """
+        return iter(json.load(f).values())
+
+
+class _Unpickler(pickle.Unpickler):
+    """ Unpickler of plain data only: no class or function is ever
+    loaded, so a snapshot cannot run code
+    """
+
+    def find_class(self, module: str, name: str):
+        """ Refuse every global
+        """
+        raise pickle.UnpicklingError(
+            "global '{}.{}' is forbidden".format(module, name))
+
+
+class BinarySerializer():
+    """ .db_<Class>.bin: a version header, then the to_json(True) values
+    stored by column, so that keys are written once per file and not
+    once per object.
+
+    Layout: b"HBDB", format version (unsigned short, big endian), then a
+    pickle (protocol 4) of (field names, one list of values per field).
+    Only plain data is unpickled (see _Unpickler).
+    """
+
+    extension = ".bin"
+    mode = "b"
+    MAGIC = b"HBDB"
+    VERSION = 1
+    HEADER = struct.Struct(">4sH")
+
+    def dump(self, items: Iterable[Tuple[str, object]], f: IO):
+        """ Write the (id, object) items
+        """
+        rows = [obj.to_json(True) for _, obj in items]
+        fields = {}
+        for row in rows:
+            if row.keys() != fields.keys():
+                fields.update(dict.fromkeys(row))
+        columns = [[row.get(key) for row in rows] for key in fields]
+        f.write(self.HEADER.pack(self.MAGIC, self.VERSION))
+        pickle.dump((tuple(fields), columns), f, protocol=4)
+
+    def load(self, f: IO) -> Iterator[dict]:
+        """ Return the to_json(True) dict of every object
+        """
+        header = f.read(self.HEADER.size)
+        if len(header) != self.HEADER.size:
+            raise ValueError("Truncated snapshot {}".format(f.name))
+        magic, version = self.HEADER.unpack(header)
+        if magic != self.MAGIC:
+            raise ValueError("Not a snapshot: {}".format(f.name))
+        if version != self.VERSION:
+            raise ValueError("Unsupported snapshot version {} in {}".format(
+                version, f.name))
+        fields, columns = _Unpickler(f).load()
+        return (dict(zip(fields, row)) for row in zip(*columns))
+
+
+SERIALIZERS = {
+    'json': JSONSerializer(),
+    'binary': BinarySerializer(),
+}
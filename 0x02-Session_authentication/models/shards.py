@@ -0,0 +1,225 @@
+#!/usr/bin/env python3
+""" Sharded store module
+"""
+from collections.abc import Mapping, MutableMapping
+from itertools import count
+from operator import itemgetter
+from typing import Iterable, Iterator, List, Tuple
+import threading
+
+
+class StoreView(Mapping):
+    """ Frozen version of a ShardedStore
+
+    The shard dicts it holds are never modified again, so a view stays
+    consistent while writers go on, and is freed with its shards once no
+    reader holds it.
+    """
+
+    def __init__(self, shards: tuple):
+        """ Initialize a view over frozen shards
+        """
+        self._shards = shards
+        self._count = len(shards)
+        self._entries = None
+
+    def entries(self) -> list:
+        """ (seq, id, object) entries in insertion order
+        """
+        if self._entries is None:
+            entries = []
+            for shard in self._shards:
+                entries.extend(shard.values())
+            # every shard is already in order: sorting only merges the runs
+            entries.sort(key=itemgetter(0))
+            self._entries = entries
+        return self._entries
+
+    def __getitem__(self, key):
+        """ Return the object of key
+        """
+        return self._shards[hash(key) % self._count][key][2]
+
+    def get(self, key, default=None):
+        """ Return the object of key or default
+        """
+        entry = self._shards[hash(key) % self._count].get(key)
+        return default if entry is None else entry[2]
+
+    def __contains__(self, key) -> bool:
+        """ Membership
+        """
+        return key in self._shards[hash(key) % self._count]
+
+    def items(self) -> List[Tuple]:
+        """ (id, object) pairs in insertion order
+        """
+        return list(map(itemgetter(1, 2), self.entries()))
+
+    def values(self) -> list:
+        """ Objects in insertion order
+        """
+        return list(map(itemgetter(2), self.entries()))
+
+    def keys(self) -> list:
+        """ Ids in insertion order
+        """
+        return list(map(itemgetter(1), self.entries()))
+
+    def __iter__(self) -> Iterator:
+        """ Iterate over the ids
+        """
+        return iter(self.keys())
+
+    def __len__(self) -> int:
+        """ Number of objects
+        """
+        return sum(map(len, self._shards))
+
+
+class ShardedStore(MutableMapping):
+    """ id -> object mapping split into shards by hash of the id
+
+    Writers change their shard in place under the lock of that shard, so
+    a write costs O(1) and writers of different shards do not wait for
+    each other. Point reads never lock.
+    view() returns an immutable version of the whole store. It is built
+    on the first call after a write, from frozen copies of the shards:
+    only the shards written since the previous view are copied again,
+    while every shard lock is held so that the version is consistent.
+    Until the next write, every view() call returns it without locking.
+    Like a dict, iteration follows insertion order: every new id gets a
+    sequence number, kept in its (seq, id, object) entry.
+    """
+
+    def __init__(self, shards: int = 64, items: Iterable[Tuple] = ()):
+        """ Initialize a store of shards dicts holding items
+        """
+        self._count = max(1, shards)
+        self._locks = [threading.Lock() for _ in range(self._count)]
+        self._seq = count()
+        self._shards = [{} for _ in range(self._count)]
+        self._frozen = [None] * self._count
+        self._view = None
+        self._put(items)
+
+    def _put(self, items: Iterable[Tuple]):
+        """ Store the (id, object) items, with the locks of their shards
+        held or before the store is shared
+        """
+        for key, value in items:
+            shard = self._shards[hash(key) % self._count]
+            entry = shard.get(key)
+            seq = next(self._seq) if entry is None else entry[0]
+            shard[key] = (seq, key, value)
+
+    def view(self) -> StoreView:
+        """ Consistent, immutable version of the store
+        """
+        view = self._view
+        if view is not None:
+            return view
+        for lock in self._locks:
+            lock.acquire()
+        try:
+            if self._view is None:
+                for idx, frozen in enumerate(self._frozen):
+                    if frozen is None:
+                        self._frozen[idx] = dict(self._shards[idx])
+                self._view = StoreView(tuple(self._frozen))
+            return self._view
+        finally:
+            for lock in self._locks:
+                lock.release()
+
+    def _changed(self, idx: int):
+        """ Drop the frozen copy of a shard written to, with its lock held
+        """
+        self._frozen[idx] = None
+        self._view = None
+
+    def __getitem__(self, key):
+        """ Return the object of key, without locking
+        """
+        return self._shards[hash(key) % self._count][key][2]
+
+    def get(self, key, default=None):
+        """ Return the object of key or default, without locking
+        """
+        entry = self._shards[hash(key) % self._count].get(key)
+        return default if entry is None else entry[2]
+
+    def __contains__(self, key) -> bool:
+        """ Membership, without locking
+        """
+        return key in self._shards[hash(key) % self._count]
+
+    def __setitem__(self, key, value):
+        """ Store an object
+        """
+        idx = hash(key) % self._count
+        with self._locks[idx]:
+            self._put(((key, value),))
+            self._changed(idx)
+
+    def update(self, items: Iterable[Tuple] = (), **kwargs):
+        """ Store many (id, object) items at once: views see all of them
+        or none
+        """
+        if isinstance(items, Mapping):
+            items = items.items()
+        items = list(items) + list(kwargs.items())
+        # locks are taken in index order, like view() does
+        touched = sorted({hash(key) % self._count for key, _ in items})
+        for idx in touched:
+            self._locks[idx].acquire()
+        try:
+            self._put(items)
+            for idx in touched:
+                self._changed(idx)
+        finally:
+            for idx in touched:
+                self._locks[idx].release()
+
+    def __delitem__(self, key):
+        """ Remove an object
+        """
+        self.pop(key)
+
+    def pop(self, key, *default):
+        """ Remove and return an object, atomically
+        """
+        idx = hash(key) % self._count
+        with self._locks[idx]:
+            entry = self._shards[idx].pop(key, None)
+            if entry is not None:
+                self._changed(idx)
+                return entry[2]
+        if default:
+            return default[0]
+        raise KeyError(key)
+
+    def items(self) -> List[Tuple]:
+        """ Snapshot of the (id, object) pairs
+        """
+        return self.view().items()
+
+    def values(self) -> list:
+        """ Snapshot of the objects
+        """
+        return self.view().values()
+
+    def keys(self) -> list:
+        """ Snapshot of the ids
+        """
+        return self.view().keys()
+
+    def __iter__(self) -> Iterator:
+        """ Iterate over a snapshot of the ids
+        """
+        return iter(self.view().keys())
+
+    def __len__(self) -> int:
+        """ Number of objects, in one version of the store
+        """
+        return len(self.view())
@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+""" SQLite storage module
+"""
+from os import getenv, path
+from typing import Iterator, TypeVar
+import json
+import sqlite3
+import threading
+
+from models.storage import Storage, matches
+
+
+SQLITE_PATH = getenv("SQLITE_PATH", ".db.sqlite3")
+
+_local = threading.local()
+
+
+def connect(db_path: str) -> sqlite3.Connection:
+    """ Connection of the current thread to db_path, shared by every
+    class so that a batch runs as one transaction
+    """
+    conns = getattr(_local, 'conns', None)
+    if conns is None:
+        conns = _local.conns = {}
+    if conns.get(db_path) is None:
+        conn = sqlite3.connect(db_path, cached_statements=256)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conns[db_path] = conn
+    return conns[db_path]
+
+
+class SQLiteStorage(Storage):
+    """ Objects of one class stored in a SQLite table
+
+    Each row holds the serialized object plus one indexed column per
+    INDEXED_ATTRIBUTES entry. The database runs in WAL mode so readers
+    do not block the writer, and each thread has its own connection.
+    """
+
+    def __init__(self, cls, db_path: str = SQLITE_PATH):
+        """ Initialize the storage of cls and create its table
+        """
+        super().__init__(cls)
+        self.db_path = db_path
+        self.columns = tuple(cls.INDEXED_ATTRIBUTES)
+        table = '"{}"'.format(self.s_class)
+        quoted = ['"{}"'.format(col) for col in self.columns]
+        self._select = "SELECT data FROM {}".format(table)
+        self._get = self._select + " WHERE id = ?"
+        self._count = "SELECT COUNT(*) FROM {}".format(table)
+        self._upsert = (
+            "INSERT INTO {} (id, data{}) VALUES (?, ?{}) "
+            "ON CONFLICT(id) DO UPDATE SET data = excluded.data{}".format(
+                table,
+                "".join(", " + col for col in quoted),
+                ", ?" * len(quoted),
+                "".join(", {0} = excluded.{0}".format(col)
+                        for col in quoted)))
+        self._delete = "DELETE FROM {} WHERE id = ?".format(table)
+
+        conn = self.connection()
+        conn.execute("CREATE TABLE IF NOT EXISTS {} "
+                     "(id TEXT PRIMARY KEY, data TEXT NOT NULL{})".format(
+                         table, "".join(", " + col for col in quoted)))
+        for col, name in zip(quoted, self.columns):
+            conn.execute('CREATE INDEX IF NOT EXISTS "ix_{}_{}" '
+                         'ON {} ({})'.format(self.s_class, name, table, col))
+        conn.commit()
+
+    def connection(self) -> sqlite3.Connection:
+        """ Connection of the current thread
+        """
+        return connect(self.db_path)
+
+    def _build(self, data: str) -> TypeVar('Base'):
+        """ Object from its serialized row
+        """
+        return self.cls(**json.loads(data))
+
+    def _params(self, obj: TypeVar('Base')) -> tuple:
+        """ Upsert parameters for obj
+        """
+        return (obj.id, obj.to_json_string(True)) + tuple(
+            getattr(obj, col, None) for col in self.columns)
+
+    def load(self):
+        """ Import .db_<Class>.json the first time the table is used
+        """
+        file_path = ".db_{}.json".format(self.s_class)
+        if self.count() > 0 or not path.exists(file_path):
+            return
+        with open(file_path, 'r') as f:
+            objs_json = json.load(f)
+        conn = self.connection()
+        with conn:
+            conn.executemany(self._upsert, (
+                self._params(self.cls(**obj_json))
+                for obj_json in objs_json.values()))
+
+    def save_all(self):
+        """ Every write is already in the database
+        """
+
+    def get(self, obj_id: str) -> TypeVar('Base'):
+        """ Return one object by id
+        """
+        row = self.connection().execute(self._get, (obj_id,)).fetchone()
+        return self._build(row[0]) if row else None
+
+    def iterate(self, attributes: dict) -> Iterator[TypeVar('Base')]:
+        """ Yield the objects with matching attributes, reading rows as
+        they are needed
+        Attributes with a column are matched by SQLite, using its index.
+        """
+        where = []
+        params = []
+        for k, v in attributes.items():
+            if k in self.columns and (v is None or
+                                      isinstance(v, (str, int, float))):
+                where.append('"{}" IS ?'.format(k))
+                params.append(v)
+        query = self._select
+        if where:
+            query += " WHERE " + " AND ".join(where)
+        query += " ORDER BY rowid"
+        for data, in self.connection().execute(query, params):
+            obj = self._build(data)
+            if matches(obj, attributes):
+                yield obj
+
+    def count(self) -> int:
+        """ Count all objects
+        """
+        return self.connection().execute(self._count).fetchone()[0]
+
+    def save(self, obj: TypeVar('Base')):
+        """ Insert or update obj
+        """
+        conn = self.connection()
+        conn.execute(self._upsert, self._params(obj))
+        if self.join_batch() is None:
+            conn.commit()
+
+    def remove(self, obj: TypeVar('Base')):
+        """ Delete obj
+        """
+        conn = self.connection()
+        conn.execute(self._delete, (obj.id,))
+        if self.join_batch() is None:
+            conn.commit()
+
+    def commit(self, pending: list):
+        """ Commit the transaction of the batch
+        """
+        self.connection().commit()
+
+    def rollback(self, pending: list):
+        """ Roll back the transaction of the batch
+        """
+        self.connection().rollback()
@@ -0,0 +1,558 @@
+#!/usr/bin/env python3
+""" Storage module
+"""
+from contextlib import contextmanager
+from os import getenv, path
+from typing import Iterator, List, Optional, TypeVar
+import fcntl
+import os
+import threading
+
+from models.flusher import Flusher
+from models.index import Index
+from models.journal import Journal
+from models.lazy import LazyObjects
+from models.serializer import SERIALIZERS
+from models.shards import ShardedStore
+
+
+DATA = {}
+
+STORAGE_TYPE = getenv("STORAGE_TYPE", "json")
+JOURNAL_MAX_SIZE = int(getenv("JOURNAL_MAX_SIZE", str(4 * 1024 * 1024)))
+LOAD_TYPE = getenv("LOAD_TYPE", "eager")
+# seconds between writes of a changed JSON file, 0 to write on each change
+FLUSH_INTERVAL = float(getenv("FLUSH_INTERVAL", "0"))
+# '1' when several processes (pre-fork workers) share the JSON files
+SHARED_STORAGE = getenv("SHARED_STORAGE", "0") == "1"
+# format of the snapshots of the JSON storage: 'json' or 'binary'
+SNAPSHOT_FORMAT = getenv("SNAPSHOT_FORMAT", "json")
+# number of copy-on-write shards of the objects of each class in memory
+DATA_SHARDS = int(getenv("DATA_SHARDS", "64"))
+# objects built from the file kept by LOAD_TYPE 'lazy', 0 to keep them all
+HYDRATED_CACHE_SIZE = int(getenv("HYDRATED_CACHE_SIZE", "0"))
+
+_local = threading.local()
+# held by every change to the objects of a FileStorage and every write of
+# its file, and by a batch from its first write until it ends
+_write_lock = threading.RLock()
+_flusher = Flusher(FLUSH_INTERVAL, _write_lock)
+
+
+def flush():
+    """ Write every change still waiting for the write-behind flusher
+    """
+    _flusher.flush()
+
+
+def current_batch() -> Optional[dict]:
+    """ Storages touched by the Base.batch() block running in this
+    thread, each with its queued writes, or None outside of a batch
+    """
+    return getattr(_local, 'batch', None)
+
+
+def set_batch(batch: Optional[dict]):
+    """ Start (with an empty dict) or end (with None) a batch
+    """
+    _local.batch = batch
+
+
+def file_signature(st: os.stat_result) -> tuple:
+    """ What changes whenever a file is replaced or rewritten
+    """
+    return (st.st_ino, st.st_mtime_ns, st.st_size)
+
+
+def matches(obj, attributes: dict) -> bool:
+    """ True if every attribute of obj equals the searched value
+    """
+    for k, v in attributes.items():
+        if (getattr(obj, k) != v):
+            return False
+    return True
+
+
+class Storage():
+    """ Where the objects of one Base subclass live
+
+    Base.get/search/all/count/save/remove and the file helpers delegate
+    to the storage of the class.
+    """
+
+    def __init__(self, cls):
+        """ Initialize the storage of cls
+        """
+        self.cls = cls
+        self.s_class = cls.__name__
+
+    def load(self):
+        """ Load the objects from where they are persisted
+        """
+        raise NotImplementedError()
+
+    def save_all(self):
+        """ Persist every object
+        """
+        raise NotImplementedError()
+
+    def get(self, obj_id: str) -> TypeVar('Base'):
+        """ Return one object by id, or None
+        """
+        raise NotImplementedError()
+
+    def iterate(self, attributes: dict) -> Iterator[TypeVar('Base')]:
+        """ Yield the objects with matching attributes, one at a time
+        """
+        raise NotImplementedError()
+
+    def search(self, attributes: dict) -> List[TypeVar('Base')]:
+        """ Return every object with matching attributes
+        """
+        return list(self.iterate(attributes))
+
+    def count(self) -> int:
+        """ Number of objects
+        """
+        raise NotImplementedError()
+
+    def save(self, obj: TypeVar('Base')):
+        """ Store a new or updated object
+        """
+        raise NotImplementedError()
+
+    def save_many(self, objs: List[TypeVar('Base')]):
+        """ Store many new or updated objects
+        """
+        for obj in objs:
+            self.save(obj)
+
+    def changed(self, obj: TypeVar('Base'), attr: str):
+        """ Called when an INDEXED_ATTRIBUTES attribute of obj is set
+        """
+
+    def remove(self, obj: TypeVar('Base')):
+        """ Delete an object
+        """
+        raise NotImplementedError()
+
+    def join_batch(self) -> Optional[list]:
+        """ Register in the running batch, if any
+        Returns the list where writes wait for the batch to commit, or
+        None outside of a batch.
+        """
+        batch = current_batch()
+        if batch is None:
+            return None
+        if self not in batch:
+            batch[self] = []
+            self.begin()
+        return batch[self]
+
+    def begin(self):
+        """ Called when the storage joins a batch
+        """
+
+    def end(self):
+        """ Called once the batch the storage joined is committed or
+        rolled back, even if that failed
+        """
+
+    def commit(self, pending: list):
+        """ Persist the writes of the batch
+        """
+
+    def rollback(self, pending: list):
+        """ Drop the writes of the batch
+        """
+
+
+class FileStorage(Storage):
+    """ Objects kept in DATA and mirrored to .db_<Class>.json, either
+    rewritten on each change or, with STORAGE_TYPE 'journal', through an
+    append-only journal.
+    With FLUSH_INTERVAL set, the JSON file is rewritten in the background
+    at most once per interval instead (see models.flusher for the
+    data-loss window).
+
+    With SHARED_STORAGE set, JSON files are shared between processes:
+    writes hold an exclusive flock on .db_<Class>.lock and merge the
+    changes of other processes before rewriting the file, and reads
+    reload the file when its signature (inode, mtime, size) differs from
+    the one last read or written. Changes are then written through,
+    whatever FLUSH_INTERVAL is.
+
+    With SNAPSHOT_FORMAT 'binary' (eager loading only), the file is
+    .db_<Class>.bin instead (see models.serializer). An existing
+    .db_<Class>.json is migrated on the first load and left in place.
+
+    Objects in memory live in a ShardedStore of DATA_SHARDS shards, so
+    threads can save while others read or write the file. Searches and
+    saves of the whole class work on one immutable version of it.
+    """
+
+    def __init__(self, cls):
+        """ Initialize the storage of cls
+        """
+        super().__init__(cls)
+        snapshot_format = SNAPSHOT_FORMAT
+        if STORAGE_TYPE == "journal" or LOAD_TYPE == "lazy":
+            snapshot_format = "json"
+        self.serializer = SERIALIZERS[snapshot_format]
+        self.file_path = ".db_{}{}".format(self.s_class,
+                                           self.serializer.extension)
+        self.lock_path = ".db_{}.lock".format(self.s_class)
+        self._signature = None
+        self._index = None
+        self._journal = None
+        self._save_lock = threading.Lock()
+        self._file_lock_held = threading.local()
+        if DATA.get(self.s_class) is None:
+            DATA[self.s_class] = ShardedStore(DATA_SHARDS)
+
+    @property
+    def objects(self) -> ShardedStore:
+        """ The id -> object mapping of the class
+        """
+        return DATA[self.s_class]
+
+    def journal(self) -> Journal:
+        """ Journal of the class, used when STORAGE_TYPE is 'journal'
+        """
+        if self._journal is None:
+            self._journal = Journal(self.s_class, JOURNAL_MAX_SIZE)
+        return self._journal
+
+    def index(self) -> Index:
+        """ Hash indexes on the INDEXED_ATTRIBUTES of the class
+        """
+        if self._index is None:
+            index = Index(self.cls.INDEXED_ATTRIBUTES)
+            objs = self.objects
+            if isinstance(objs, LazyObjects):
+                for obj_id in objs:
+                    index.add(objs.peek(obj_id))
+            else:
+                for obj in objs.values():
+                    index.add(obj)
+            self._index = index
+        return self._index
+
+    def load(self):
+        """ Load all objects from file
+        With LOAD_TYPE 'lazy' (JSON storage only), objects are built from
+        the file on first access instead.
+        """
+        with _write_lock:
+            if self.write_behind():
+                _flusher.flush(self)
+            self._load()
+
+    def _load(self):
+        """ Replace the objects in memory with the persisted ones
+        """
+        cls = self.cls
+        self._index = None
+        if STORAGE_TYPE == "journal":
+            journal = self.journal()
+            objs = (cls(**obj_json) for obj_json in journal.replay().values())
+            DATA[self.s_class] = ShardedStore(
+                DATA_SHARDS, ((obj.id, obj) for obj in objs))
+            if journal.needs_recovery():
+                journal.compact()
+            return
+        if LOAD_TYPE == "lazy":
+            DATA[self.s_class] = LazyObjects(cls, self.file_path,
+                                             HYDRATED_CACHE_SIZE)
+            self._signature = self.signature()
+            return
+        if not path.exists(self.file_path):
+            DATA[self.s_class] = ShardedStore(DATA_SHARDS)
+            self._signature = None
+            self._migrate()
+            return
+
+        with open(self.file_path, 'r' + self.serializer.mode) as f:
+            self._signature = file_signature(os.fstat(f.fileno()))
+            objs = (cls(**obj_json) for obj_json in self.serializer.load(f))
+            DATA[self.s_class] = ShardedStore(
+                DATA_SHARDS, ((obj.id, obj) for obj in objs))
+
+    def _migrate(self):
+        """ Load the snapshot of another format, if any, and rewrite it in
+        the format of the storage
+        """
+        for serializer in SERIALIZERS.values():
+            file_path = ".db_{}{}".format(self.s_class, serializer.extension)
+            if serializer is self.serializer or not path.exists(file_path):
+                continue
+            with open(file_path, 'r' + serializer.mode) as f:
+                objs = (self.cls(**obj_json)
+                        for obj_json in serializer.load(f))
+                DATA[self.s_class] = ShardedStore(
+                    DATA_SHARDS, ((obj.id, obj) for obj in objs))
+            if self.shared():
+                with self.file_lock():
+                    self._save_all()
+            else:
+                self._save_all()
+            return
+
+    def signature(self) -> Optional[tuple]:
+        """ Signature of the snapshot file, None if there is no file
+        """
+        try:
+            return file_signature(os.stat(self.file_path))
+        except FileNotFoundError:
+            return None
+
+    def shared(self) -> bool:
+        """ True if other processes may write the JSON file
+        """
+        return SHARED_STORAGE and STORAGE_TYPE == "json"
+
+    @contextmanager
+    def file_lock(self):
+        """ Hold the lock of the JSON file against other processes
+        Reentrant within a thread: a flock taken again through another
+        file descriptor would wait for itself.
+        """
+        if getattr(self._file_lock_held, 'value', False):
+            yield
+            return
+        with open(self.lock_path, 'a') as f:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+            self._file_lock_held.value = True
+            try:
+                yield
+            finally:
+                self._file_lock_held.value = False
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+    def refresh(self):
+        """ Reload the JSON file if another process wrote it
+        Objects whose record did not change are kept as they are. Does
+        nothing inside a batch, so that its changes stay visible.
+        """
+        if not self.shared() or self.signature() == self._signature:
+            return
+        batch = current_batch()
+        if batch is not None and self in batch:
+            return
+        with _write_lock:
+            if self.signature() != self._signature:
+                self._reload()
+
+    def _reload(self):
+        """ refresh, with the write lock held
+        """
+        if isinstance(self.objects, LazyObjects) or \
+                not path.exists(self.file_path):
+            self._load()
+            return
+        old = self.objects
+        with open(self.file_path, 'r' + self.serializer.mode) as f:
+            signature = file_signature(os.fstat(f.fileno()))
+            objs_json = list(self.serializer.load(f))
+        objs = (self._reuse(old, obj_json) for obj_json in objs_json)
+        DATA[self.s_class] = ShardedStore(
+            DATA_SHARDS, ((obj.id, obj) for obj in objs))
+        self._index = None
+        self._signature = signature
+
+    def _reuse(self, old: ShardedStore, obj_json: dict) -> TypeVar('Base'):
+        """ The object of obj_json in old if its record did not change,
+        otherwise a new one
+        """
+        obj = old.get(obj_json.get('id'))
+        if obj is None or obj.to_json(True) != obj_json:
+            obj = self.cls(**obj_json)
+        return obj
+
+    def save_all(self):
+        """ Save all objects to file
+        In shared mode, the writes of other processes are merged first.
+        """
+        with _write_lock:
+            if self.shared():
+                with self.file_lock():
+                    self.refresh()
+                    self._save_all()
+            else:
+                self._save_all()
+
+    def _save_all(self):
+        """ Write all objects, to the journal or the snapshot file
+        """
+        if STORAGE_TYPE == "journal":
+            self.journal().extend((
+                'save', obj_id, obj.to_json_string(True))
+                for obj_id, obj in self.objects.items())
+            self.journal().compact()
+            return
+        if isinstance(self.objects, LazyObjects):
+            self.objects.save_to_file()
+            self._signature = self.signature()
+            return
+        with self._save_lock:
+            tmp_path = self.file_path + ".tmp"
+            with open(tmp_path, 'w' + self.serializer.mode) as f:
+                self.serializer.dump(self.objects.items(), f)
+            os.replace(tmp_path, self.file_path)
+            self._signature = self.signature()
+
+    def write_behind(self) -> bool:
+        """ True if changes are left to the background flusher
+        """
+        return FLUSH_INTERVAL > 0 and STORAGE_TYPE != "journal" and \
+            not self.shared()
+
+    def get(self, obj_id: str) -> TypeVar('Base'):
+        """ Return one object by id
+        """
+        self.refresh()
+        return self.objects.get(obj_id)
+
+    def iterate(self, attributes: dict) -> Iterator[TypeVar('Base')]:
+        """ Yield the objects with matching attributes
+        Uses the most selective index covering the query, if any. Objects
+        come from one version of the store (see ShardedStore.view), so
+        saves and removals meanwhile neither block nor show up.
+        """
+        self.refresh()
+        objects = self.objects
+        if isinstance(objects, ShardedStore):
+            objects = objects.view()
+        ids = self.index().candidates(attributes)
+        if ids is not None:
+            objs = map(objects.get, ids)
+        elif isinstance(objects, LazyObjects):
+            objs = objects.matching(attributes)
+        else:
+            objs = objects.values()
+        for obj in objs:
+            if obj is not None and matches(obj, attributes):
+                yield obj
+
+    def count(self) -> int:
+        """ Count all objects
+        """
+        self.refresh()
+        return len(self.objects)
+
+    def save(self, obj: TypeVar('Base')):
+        """ Store obj and persist it, or queue it in the batch
+        """
+        with _write_lock:
+            self.objects[obj.id] = obj
+            self.index().add(obj)
+            self._persist('save', obj)
+
+    def save_many(self, objs: List[TypeVar('Base')]):
+        """ Store objs at once and persist them, or queue them in the
+        batch
+        """
+        with _write_lock:
+            self.objects.update((obj.id, obj) for obj in objs)
+            index = self.index()
+            for obj in objs:
+                index.add(obj)
+                self._persist('save', obj)
+
+    def changed(self, obj: TypeVar('Base'), attr: str):
+        """ Move obj to the index buckets of its new value, if obj is the
+        object held in memory, so that searches see unsaved values like
+        a scan of the objects would
+        """
+        index = self._index
+        if index is None:
+            # built from the objects in memory on its first use
+            return
+        objects = self.objects
+        try:
+            if isinstance(objects, LazyObjects):
+                stored = objects.peek(obj.id)
+            else:
+                stored = objects.get(obj.id)
+        except (AttributeError, KeyError):
+            return
+        if stored is obj:
+            index.add(obj)
+
+    def remove(self, obj: TypeVar('Base')):
+        """ Delete obj and persist it, or queue it in the batch
+        """
+        with _write_lock:
+            self.refresh()
+            if self.objects.pop(obj.id, None) is not None:
+                self.index().discard(obj.id)
+                self._persist('remove', obj)
+
+    def _persist(self, op: str, obj: TypeVar('Base')):
+        """ Write a save or remove to file, or queue it in the batch
+        """
+        pending = self.join_batch()
+        if pending is not None:
+            pending.append((op, obj))
+        elif STORAGE_TYPE == "journal":
+            obj_text = obj.to_json_string(True) if op == 'save' else None
+            self.journal().append(op, obj.id, obj_text)
+        elif self.shared():
+            self._write_shared([(op, obj)])
+        elif self.write_behind():
+            _flusher.mark(self)
+        else:
+            self.save_all()
+
+    def _write_shared(self, changes: list):
+        """ Under the file lock, merge the changes of other processes,
+        apply the (op, obj) changes again on top and rewrite the file
+        """
+        with self.file_lock():
+            self.refresh()
+            index = self.index()
+            # the last change of each object wins
+            last = {obj.id: (op, obj) for op, obj in changes}
+            saved = [obj for op, obj in last.values() if op == 'save']
+            self.objects.update((obj.id, obj) for obj in saved)
+            for obj in saved:
+                index.add(obj)
+            for op, obj in last.values():
+                if op == 'remove' and \
+                        self.objects.pop(obj.id, None) is not None:
+                    index.discard(obj.id)
+            self._save_all()
+
+    def commit(self, pending: list):
+        """ Write the queued changes: one file rewrite, or one journal
+        write
+        """
+        if STORAGE_TYPE == "journal":
+            self.journal().extend(
+                (op, obj.id,
+                 obj.to_json_string(True) if op == 'save' else None)
+                for op, obj in pending)
+        elif pending and self.shared():
+            self._write_shared(pending)
+        elif pending and self.write_behind():
+            _flusher.mark(self)
+        elif pending:
+            self.save_all()
+
+    def begin(self):
+        """ Hold the write lock until the batch ends: other writers and
+        the flusher cannot persist its uncommitted objects meanwhile,
+        nor change the objects a rollback reloads
+        """
+        _write_lock.acquire()
+
+    def end(self):
+        """ Let other writers in again
+        """
+        _write_lock.release()
+
+    def rollback(self, pending: list):
+        """ Reload from file, which still holds the state from before
+        the batch
+        """
+        self._load()
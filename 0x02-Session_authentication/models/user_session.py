@@ -1,16 +1,19 @@
 #!/usr/bin/env python3
 """User session module.
 """
-from models.base import Base
+from models.base import Base, intern_id
 
 
 class UserSession(Base):
     """User session class.
     """
 
+    __slots__ = ('user_id', 'session_id')
+    INDEXED_ATTRIBUTES = ('session_id', 'user_id')
+
     def __init__(self, *args: list, **kwargs: dict):
         """Initializes a User session instance.
         """
         super().__init__(*args, **kwargs)
-        self.user_id = kwargs.get('user_id')
+        self.user_id = intern_id(kwargs.get('user_id'))
         self.session_id = kwargs.get('session_id')
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+Stress test of SHARED_STORAGE: several processes writing the same
+.db_User.json, then checking that no write was lost
+"""
+
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+
+os.environ["SHARED_STORAGE"] = "1"
+os.environ.setdefault("STORAGE_TYPE", "json")
+
+from models.base import Base  # noqa: E402
+from models.user import User  # noqa: E402
+
+
+def worker(worker_id: int, count: int, barrier) -> int:
+    """ Create count users, update and remove some of them, then wait
+    for the other workers and return the number of users it sees
+    """
+    User.load_from_file()
+    users = []
+    for i in range(count):
+        user = User(email="w{}-{}@example.com".format(worker_id, i))
+        user.save()
+        users.append(user)
+        if i % 10 == 9:
+            users[i - 5].last_name = "updated"
+            users[i - 5].save()
+            users[i - 9].remove()
+    with Base.batch():
+        for user in users[1:count // 10 * 10:10]:
+            user.first_name = "batched"
+            user.save()
+    barrier.wait(timeout=60)
+    return User.count()
+
+
+def expected_users(workers: int, count: int) -> dict:
+    """ email -> (first_name, last_name) of the users left at the end """
+    users = {}
+    for worker_id in range(workers):
+        for i in range(count):
+            if i % 10 == 0 and i + 9 < count:
+                continue
+            first = "batched" if i % 10 == 1 and i < count // 10 * 10 \
+                else None
+            last = "updated" if i % 10 == 4 and i + 5 < count else None
+            users["w{}-{}@example.com".format(worker_id, i)] = (first, last)
+    return users
+
+
+if __name__ == '__main__':
+    workers = int(sys.argv[1]) if len(sys.argv) > 1 else 4
+    count = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+    os.chdir(tempfile.mkdtemp())
+    manager = multiprocessing.Manager()
+    barrier = manager.Barrier(workers)
+    start = time.perf_counter()
+    with multiprocessing.Pool(workers) as pool:
+        seen = pool.starmap(worker, [(worker_id, count, barrier)
+                                     for worker_id in range(workers)])
+    elapsed = time.perf_counter() - start
+
+    User.load_from_file()
+    expected = expected_users(workers, count)
+    found = {user.email: (user.first_name, user.last_name)
+             for user in User.all()}
+    lost = [email for email in expected if email not in found]
+    wrong = [email for email in expected
+             if email in found and found[email] != expected[email]]
+    print("{} workers x {} users in {:.2f}s ({:,.0f} writes/sec)".format(
+        workers, count, elapsed, workers * count * 1.3 / elapsed))
+    print("users: {} expected, {} on disk, {} seen by workers".format(
+        len(expected), len(found), seen))
+    print("lost: {}, stale: {}, unexpected: {}".format(
+        len(lost), len(wrong), len(set(found) - set(expected))))
+    sys.exit(0 if found.keys() == expected.keys() and not wrong and
+             all(n == len(expected) for n in seen) else 1)